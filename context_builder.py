@@ -2,6 +2,74 @@
 Context Builder Module
 Constructs intelligent prompts combining story + graph + question
 """
+from itertools import islice
+
+# Static instructions for analytical questions. Sent as the chat system segment so
+# the reasoner can reuse the prefilled KV cache instead of re-reading them per question.
+ANALYSIS_SYSTEM_PROMPT = """You are a story analysis assistant who provides detailed, accurate answers in English. Answer questions using ONLY the story provided. Always respond in English language only, never in Hindi, Japanese, Chinese, or any other language.
+
+CRITICAL RULES - YOU MUST FOLLOW THESE:
+1. Answer ONLY using facts from the story provided
+2. If something is NOT in the story (like "princess", "queen", specific dates, historical figures), you MUST say: "I don't have information about [X] in this story"
+3. Do NOT make up events, characters, or details
+4. Do NOT say things like "can be inferred", "might be", "would be", "ruled from", "was known for"
+5. If asked "what happens after [event]" and the story doesn't say, respond: "The story ends with [last event]. It doesn't provide details about what happens after."
+6. Do NOT add historical information (dates, real rulers, real places) unless they're in the story
+7. Keep answer focused and based on story facts (3-5 sentences)"""
+
+# Question keywords that mark a creative rewrite request
+CREATIVE_WORDS = ('retell', 'rewrite', 'tell the story', 'narrate', 'style')
+
+# Styles in detection priority order
+STYLE_WORDS = ('indian', 'japanese', 'african', 'chinese', 'western', 'modern', 'ancient', 'medieval')
+
+# Guide retellings for the styles that have one
+JAPANESE_EXAMPLE = """
+EXAMPLE Japanese style retelling (use this as a guide):
+"Long ago in feudal Japan, a noble samurai warrior named Takeshi lived in a magnificent castle overlooking the mountains. One day, a fearsome dragon emerged from the peaks and threatened a peaceful village below. Takeshi, bound by the code of bushido and his solemn duty to protect the innocent, donned his armor and took his legendary katana sword. With unwavering honor and courage, he rode forth on his black steed to confront the beast. In an epic duel that lasted from dawn to dusk, the samurai fought with masterful skill and discipline. Through the way of the warrior, Takeshi struck down the dragon and saved the village. The grateful villagers honored him as a hero, and his name lived on in legends told by generations."
+
+YOUR TASK: Write a similar retelling using Japanese cultural elements.
+"""
+
+INDIAN_EXAMPLE = """
+EXAMPLE Indian style retelling (use this as a guide):
+"In ancient India, a valiant kshatriya warrior named Arjun lived in a magnificent palace adorned with golden domes. One day, a fearsome naga serpent demon rose from the depths and attacked a peaceful village. Arjun, remembering his sacred dharma to protect the innocent, prepared for battle. He took his blessed khanda sword, said prayers to the gods, and rode forth on his white stallion. With the divine blessings of Lord Vishnu and great courage in his heart, Arjun fought the naga in a legendary battle. After an epic confrontation where good triumphed over evil, Arjun vanquished the demon and saved the villagers. The people celebrated him as a hero chosen by the gods, and peace returned to the land."
+
+YOUR TASK: Write a similar retelling using Indian cultural elements.
+"""
+
+AFRICAN_EXAMPLE = """
+EXAMPLE African style retelling (use this as a guide):
+"In ancient times, a mighty warrior named Kwame lived in a great tribal village surrounded by the savannah. One day, a fearsome beast emerged from the wilderness and threatened his people. Kwame, guided by the wisdom of his ancestors' spirits, prepared for battle. He took his sacred spear blessed by the tribal elders and his sturdy shield. With the strength of the lion and courage of his forefathers, Kwame tracked the beast through the grasslands. In a legendary battle that shook the earth, the warrior fought with honor and skill. Through bravery and the protection of ancestral spirits, Kwame defeated the beast and saved his village. The tribal council honored him with a great feast, and his story was told around fires for generations."
+
+YOUR TASK: Write a similar retelling using African cultural elements.
+"""
+
+# Keyed by style word
+STYLE_EXAMPLES = {
+    'japanese': JAPANESE_EXAMPLE,
+    'indian': INDIAN_EXAMPLE,
+    'african': AFRICAN_EXAMPLE,
+}
+
+# build_creative_segments results per style, so the static text is formatted once
+_CREATIVE_SEGMENTS = {}
+
+def build_system_prompt(question):
+    """
+    Pick the static system segment for a question
+    
+    Returns:
+        ANALYSIS_SYSTEM_PROMPT for analytical questions, None (reasoner default) for creative ones
+    """
+    if is_creative_question(question):
+        return None
+    return ANALYSIS_SYSTEM_PROMPT
+
+def is_creative_question(question):
+    """Detect if this is a creative rewrite request"""
+    ql = question.lower()
+    return any(word in ql for word in CREATIVE_WORDS)
 
 def build_context_prompt(story, graph_data, question, cultural_info=None, specific_paths=None):
     """
@@ -18,8 +86,10 @@ def build_context_prompt(story, graph_data, question, cultural_info=None, specif
         Complete prompt string
     """
     
+    ql = question.lower()
+    
     # Detect if this is a creative rewrite request
-    is_creative_request = any(word in question.lower() for word in ['retell', 'rewrite', 'tell the story', 'narrate', 'style'])
+    is_creative_request = any(word in ql for word in CREATIVE_WORDS)
     
     # Extract story concepts (nodes marked from_story=True)
     story_concepts = [n for n in graph_data.get('nodes', []) if n.get('from_story', False)]
@@ -37,42 +107,59 @@ def build_context_prompt(story, graph_data, question, cultural_info=None, specif
     
     # Different prompt for creative vs analytical questions
     if is_creative_request:
-        # Extract the specific style requested
-        style_requested = "unknown"
-        for style_word in ['indian', 'japanese', 'african', 'chinese', 'western', 'modern', 'ancient', 'medieval']:
-            if style_word in question.lower():
-                style_requested = style_word.capitalize()
-                break
-        
-        # Provide very specific examples based on style
-        if 'japanese' in question.lower():
-            example_story = """
-EXAMPLE Japanese style retelling (use this as a guide):
-"Long ago in feudal Japan, a noble samurai warrior named Takeshi lived in a magnificent castle overlooking the mountains. One day, a fearsome dragon emerged from the peaks and threatened a peaceful village below. Takeshi, bound by the code of bushido and his solemn duty to protect the innocent, donned his armor and took his legendary katana sword. With unwavering honor and courage, he rode forth on his black steed to confront the beast. In an epic duel that lasted from dawn to dusk, the samurai fought with masterful skill and discipline. Through the way of the warrior, Takeshi struck down the dragon and saved the village. The grateful villagers honored him as a hero, and his name lived on in legends told by generations."
+        head, tail = build_creative_segments(match_style(ql))
+        prompt = head + story + tail
+    else:
+        # The rules live in ANALYSIS_SYSTEM_PROMPT; only story-specific context goes here
+        prompt = f"""STORY:
+{story}
 
-YOUR TASK: Write a similar retelling using Japanese cultural elements.
-"""
-        elif 'indian' in question.lower():
-            example_story = """
-EXAMPLE Indian style retelling (use this as a guide):
-"In ancient India, a valiant kshatriya warrior named Arjun lived in a magnificent palace adorned with golden domes. One day, a fearsome naga serpent demon rose from the depths and attacked a peaceful village. Arjun, remembering his sacred dharma to protect the innocent, prepared for battle. He took his blessed khanda sword, said prayers to the gods, and rode forth on his white stallion. With the divine blessings of Lord Vishnu and great courage in his heart, Arjun fought the naga in a legendary battle. After an epic confrontation where good triumphed over evil, Arjun vanquished the demon and saved the villagers. The people celebrated him as a hero chosen by the gods, and peace returned to the land."
+KNOWLEDGE GRAPH (Concept Relationships):
+{graph_text}
 
-YOUR TASK: Write a similar retelling using Indian cultural elements.
-"""
-        elif 'african' in question.lower():
-            example_story = """
-EXAMPLE African style retelling (use this as a guide):
-"In ancient times, a mighty warrior named Kwame lived in a great tribal village surrounded by the savannah. One day, a fearsome beast emerged from the wilderness and threatened his people. Kwame, guided by the wisdom of his ancestors' spirits, prepared for battle. He took his sacred spear blessed by the tribal elders and his sturdy shield. With the strength of the lion and courage of his forefathers, Kwame tracked the beast through the grasslands. In a legendary battle that shook the earth, the warrior fought with honor and skill. Through bravery and the protection of ancestral spirits, Kwame defeated the beast and saved his village. The tribal council honored him with a great feast, and his story was told around fires for generations."
+{cultural_text}
 
-YOUR TASK: Write a similar retelling using African cultural elements.
-"""
-        else:
-            example_story = ""
-        
-        prompt = f"""You are a creative storyteller. Retell the story below in {style_requested} cultural style IN ENGLISH.
+{paths_text}
+
+USER QUESTION:
+{question}
+
+ANSWER (using ONLY information from the story):"""
+    
+    return prompt
+
+def detect_style(question):
+    """Style word requested in a creative question, capitalized ("unknown" if none)"""
+    return match_style(question.lower())
+
+def match_style(ql):
+    """detect_style for an already-lowercased question"""
+    for style_word in STYLE_WORDS:
+        if style_word in ql:
+            return style_word.capitalize()
+    return "unknown"
+
+def build_creative_segments(style_requested):
+    """
+    Static text around the story in a creative retelling prompt
+    
+    Only depends on the style, so prompt_cache can tokenize it once per style.
+    
+    Returns:
+        (head, tail) - the prompt is head + story + tail
+    """
+    segments = _CREATIVE_SEGMENTS.get(style_requested)
+    if segments is not None:
+        return segments
+    
+    example_story = STYLE_EXAMPLES.get(style_requested.lower(), "")
+    
+    head = f"""You are a creative storyteller. Retell the story below in {style_requested} cultural style IN ENGLISH.
 
 ORIGINAL STORY:
-{story}
+"""
+    
+    tail = f"""
 
 {example_story}
 
@@ -89,34 +176,10 @@ CRITICAL REQUIREMENTS:
 REMEMBER: Write in ENGLISH words only. Use {style_requested} NAMES and CULTURAL ELEMENTS but write the story in ENGLISH.
 
 NOW WRITE YOUR {style_requested.upper()} STYLE RETELLING IN ENGLISH:"""
-    else:
-        prompt = f"""You are a story analysis assistant. Answer questions using ONLY the story provided.
-
-STORY:
-{story}
-
-KNOWLEDGE GRAPH (Concept Relationships):
-{graph_text}
-
-{cultural_text}
-
-{paths_text}
-
-USER QUESTION:
-{question}
-
-CRITICAL RULES - YOU MUST FOLLOW THESE:
-1. Answer ONLY using facts from the story above
-2. If something is NOT in the story (like "princess", "queen", specific dates, historical figures), you MUST say: "I don't have information about [X] in this story"
-3. Do NOT make up events, characters, or details
-4. Do NOT say things like "can be inferred", "might be", "would be", "ruled from", "was known for"
-5. If asked "what happens after [event]" and the story doesn't say, respond: "The story ends with [last event]. It doesn't provide details about what happens after."
-6. Do NOT add historical information (dates, real rulers, real places) unless they're in the story
-7. Keep answer focused and based on story facts (3-5 sentences)
-
-ANSWER (using ONLY information from the story):"""
     
-    return prompt
+    # Styles come from detect_style, so this holds at most len(STYLE_WORDS) + 1 entries
+    _CREATIVE_SEGMENTS[style_requested] = (head, tail)
+    return head, tail
 
 def format_graph_relationships(story_concepts, related_concepts, edges):
     """Format graph data as readable text"""
@@ -133,10 +196,10 @@ def format_graph_relationships(story_concepts, related_concepts, edges):
     # Group edges by source concept
     edge_map = {}
     for edge in edges:
-        source = edge.get('source', '')
-        if source not in edge_map:
-            edge_map[source] = []
-        edge_map[source].append(edge)
+        edge_map.setdefault(edge.get('source', ''), []).append(edge)
+    
+    # Index labels once instead of scanning every node per lookup
+    label_index = build_label_index(story_concepts + related_concepts)
     
     # Format relationships
     count = 0
@@ -145,11 +208,11 @@ def format_graph_relationships(story_concepts, related_concepts, edges):
             break
         
         # Find source label
-        source_label = get_node_label(source_id, story_concepts + related_concepts)
+        source_label = lookup_label(label_index, source_id)
         
-        for edge in source_edges[:3]:  # Back to 3 edges per source
+        for edge in islice(source_edges, 3):  # Back to 3 edges per source
             target_id = edge.get('target', '')
-            target_label = get_node_label(target_id, story_concepts + related_concepts)
+            target_label = lookup_label(label_index, target_id)
             relation = edge.get('label', 'related to')
             
             lines.append(f"  • {source_label} --[{relation}]--> {target_label}")
@@ -192,6 +255,21 @@ def format_specific_paths(paths):
     
     return "\n".join(lines)
 
+def build_label_index(nodes):
+    """Map node id -> label (first node wins, matching get_node_label)"""
+    label_index = {}
+    for node in nodes:
+        node_id = node.get('id')
+        if node_id not in label_index:
+            label_index[node_id] = node.get('label', node_id)
+    return label_index
+
+def lookup_label(label_index, node_id):
+    """O(1) equivalent of get_node_label using a prebuilt index"""
+    if node_id in label_index:
+        return label_index[node_id]
+    return node_id.replace('_', ' ').title()
+
 def get_node_label(node_id, nodes):
     """Helper to get readable label for a node ID"""
     for node in nodes:
@@ -1,8 +1,22 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import os
+import importlib.util
+
+# hf_transfer (parallel Rust downloader) is optional - huggingface_hub errors if it is enabled but missing
+if importlib.util.find_spec("hf_transfer") is not None:
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+from huggingface_hub import snapshot_download, hf_hub_download
 
 model_id = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+gguf_repo = "TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF"
+gguf_file = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
 
+# Only prefetch the files llm_reasoner loads: safetensors weights (mmap-loaded), config and tokenizer
 print(f"📥 Downloading {model_id} ...")
-tokenizer = AutoTokenizer.from_pretrained(model_id)
-model = AutoModelForCausalLM.from_pretrained(model_id)
-print("✅ TinyLlama downloaded and cached successfully!")
\ No newline at end of file
+snapshot_download(model_id, allow_patterns=["*.safetensors", "*.json", "tokenizer.*"])
+print("✅ TinyLlama downloaded and cached successfully!")
+
+# Quantized build used by llm_reasoner when llama-cpp-python is installed
+print(f"📥 Downloading {gguf_repo}/{gguf_file} ...")
+gguf_path = hf_hub_download(repo_id=gguf_repo, filename=gguf_file)
+print(f"✅ GGUF model cached at {gguf_path}")
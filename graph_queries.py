@@ -2,8 +2,202 @@
 Graph Query Helper Module
 Extract specific information from graph structure
 """
+import re
+import threading
 from collections import deque
 
+# pyahocorasick is optional - without it mentions are found with one compiled regex
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# numba is optional - without it every BFS runs in pure Python
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+# Adjacency per graph, keyed by id(graph_data). The nodes/edges list objects and their
+# lengths are stored with the entry, so a recycled id or a replaced/grown list is a miss.
+_ADJ_CACHE = {}
+_ADJ_CACHE_MAX = 64
+
+# Concept-mention matchers keyed by the tuple of known concepts
+_MATCHER_CACHE = {}
+_MATCHER_CACHE_MAX = 32
+
+# Request threads share both caches; a lookup is one atomic get(), evict-and-insert takes the lock
+_CACHE_LOCK = threading.Lock()
+
+# Graphs with at least this many connected nodes get a CSR copy for the JIT-compiled BFS;
+# below it the dict-of-lists BFS is faster than crossing into numba
+_JIT_MIN_NODES = 256
+
+def _build_adj(graph_data):
+    """
+    Build an indexed view of a graph once and reuse it across queries
+    
+    Args:
+        graph_data: Dict with 'nodes' and 'edges'
+    
+    Returns:
+        (graph, edge_labels, label_index, incident, csr) - node id -> neighbor ids,
+        (id, id) -> relation label, node id -> display label, node id ->
+        (source, relation, target) of its edges in edge order, and
+        (indptr, indices, ids, id_to_idx) for the JIT BFS (None for small graphs)
+    """
+    nodes = graph_data.get('nodes', [])
+    edges = graph_data.get('edges', [])
+    
+    key = id(graph_data)
+    cached = _ADJ_CACHE.get(key)
+    if cached is not None:
+        cached_nodes, cached_edges, sizes, adj = cached
+        if cached_nodes is nodes and cached_edges is edges and sizes == (len(nodes), len(edges)):
+            return adj
+    
+    graph = {}
+    edge_labels = {}
+    incident = {}
+    
+    for edge in edges:
+        source = edge.get('source', '')
+        target = edge.get('target', '')
+        label = edge.get('label', 'related')
+        
+        graph.setdefault(source, []).append(target)
+        graph.setdefault(target, []).append(source)  # Undirected
+        
+        edge_labels[(source, target)] = label
+        edge_labels[(target, source)] = label
+        
+        # Self-loops are listed once
+        row = (source, label, target)
+        incident.setdefault(source, []).append(row)
+        if target != source:
+            incident.setdefault(target, []).append(row)
+    
+    # First node wins for duplicate ids, same as get_node_label
+    label_index = {}
+    for node in nodes:
+        node_id = node.get('id')
+        if node_id not in label_index:
+            label_index[node_id] = node.get('label', node_id)
+    
+    csr = _build_csr(graph) if njit is not None and len(graph) >= _JIT_MIN_NODES else None
+    
+    adj = (graph, edge_labels, label_index, incident, csr)
+    
+    with _CACHE_LOCK:
+        if len(_ADJ_CACHE) >= _ADJ_CACHE_MAX:
+            _ADJ_CACHE.pop(next(iter(_ADJ_CACHE)))
+        _ADJ_CACHE[key] = (nodes, edges, (len(nodes), len(edges)), adj)
+    
+    return adj
+
+def _build_csr(graph):
+    """
+    CSR form of an adjacency dict with int32 node indices
+    
+    Neighbor order is kept, so the JIT BFS breaks ties like the Python one.
+    """
+    ids = list(graph)
+    id_to_idx = {node_id: i for i, node_id in enumerate(ids)}
+    
+    indptr = np.zeros(len(ids) + 1, dtype=np.int32)
+    indices = np.empty(sum(len(neighbors) for neighbors in graph.values()), dtype=np.int32)
+    
+    pos = 0
+    for i, node_id in enumerate(ids):
+        for neighbor in graph[node_id]:
+            indices[pos] = id_to_idx[neighbor]
+            pos += 1
+        indptr[i + 1] = pos
+    
+    return indptr, indices, ids, id_to_idx
+
+if njit is not None:
+    @njit(cache=True)
+    def _bfs_path_csr(indptr, indices, src, dst):
+        """Shortest path src -> dst as node indices (empty if unreachable)"""
+        n = indptr.shape[0] - 1
+        parent = np.full(n, -1, np.int32)
+        parent[src] = src
+        queue = np.empty(n, np.int32)
+        queue[0] = src
+        head = 0
+        tail = 1
+        
+        while head < tail:
+            current = queue[head]
+            head += 1
+            if current == dst:
+                break
+            for k in range(indptr[current], indptr[current + 1]):
+                neighbor = indices[k]
+                if parent[neighbor] == -1:
+                    parent[neighbor] = current
+                    queue[tail] = neighbor
+                    tail += 1
+        
+        if parent[dst] == -1:
+            return np.empty(0, np.int32)
+        
+        length = 1
+        node = dst
+        while node != src:
+            node = parent[node]
+            length += 1
+        
+        path = np.empty(length, np.int32)
+        node = dst
+        for i in range(length - 1, -1, -1):
+            path[i] = node
+            node = parent[node]
+        return path
+    
+    @njit(cache=True)
+    def _bfs_neighbors_csr(indptr, indices, src, hops):
+        """Nodes within hops of src in discovery order, with the node that found each and its distance"""
+        n = indptr.shape[0] - 1
+        dist = np.full(n, -1, np.int32)
+        dist[src] = 0
+        queue = np.empty(n, np.int32)
+        found_by = np.empty(n, np.int32)
+        queue[0] = src
+        head = 0
+        tail = 1
+        
+        while head < tail:
+            current = queue[head]
+            head += 1
+            if dist[current] >= hops:
+                continue
+            for k in range(indptr[current], indptr[current + 1]):
+                neighbor = indices[k]
+                if dist[neighbor] == -1:
+                    dist[neighbor] = dist[current] + 1
+                    found_by[tail] = current
+                    queue[tail] = neighbor
+                    tail += 1
+        
+        return queue[1:tail], found_by[1:tail], dist
+    
+    # Compile (or load from the on-disk cache) now so the first query doesn't pay for it
+    _warm_indptr = np.array([0, 1, 2], dtype=np.int32)
+    _warm_indices = np.array([1, 0], dtype=np.int32)
+    _bfs_path_csr(_warm_indptr, _warm_indices, 0, 1)
+    _bfs_neighbors_csr(_warm_indptr, _warm_indices, 0, 1)
+
+def _lookup_label(label_index, node_id):
+    """O(1) equivalent of get_node_label using a prebuilt id -> label index"""
+    if node_id in label_index:
+        return label_index[node_id]
+    return node_id.replace('_', ' ').title()
+
 def find_concept_relationships(graph_data, concept):
     """
     Find all relationships for a specific concept
@@ -16,22 +210,46 @@ def find_concept_relationships(graph_data, concept):
         List of (concept1, relation, concept2) tuples
     """
     concept_id = concept.lower().replace(' ', '_')
-    edges = graph_data.get('edges', [])
-    nodes = graph_data.get('nodes', [])
+    _, _, label_index, incident, _ = _build_adj(graph_data)
     
+    # Only the concept's own edges, not a scan over the whole edge list
     relationships = []
+    for source, relation, target in incident.get(concept_id, []):
+        source_label = _lookup_label(label_index, source)
+        target_label = _lookup_label(label_index, target)
+        relationships.append((source_label, relation, target_label))
     
-    for edge in edges:
-        source = edge.get('source', '')
-        target = edge.get('target', '')
-        relation = edge.get('label', 'related')
+    return relationships
+
+def _bfs_path(graph, start, goal):
+    """Shortest path of node ids from start to goal over an adjacency dict, or None"""
+    # Remember each node's parent instead of copying paths
+    queue = deque([start])
+    parent = {start: None}
+    
+    while queue:
+        current = queue.popleft()
         
-        if source == concept_id or target == concept_id:
-            source_label = get_node_label(source, nodes)
-            target_label = get_node_label(target, nodes)
-            relationships.append((source_label, relation, target_label))
+        if current == goal:
+            break
+        
+        # Explore neighbors
+        for neighbor in graph.get(current, []):
+            if neighbor not in parent:
+                parent[neighbor] = current
+                queue.append(neighbor)
     
-    return relationships
+    if goal not in parent:
+        return None
+    
+    # Walk parents back from the goal
+    path = []
+    node = goal
+    while node is not None:
+        path.append(node)
+        node = parent[node]
+    path.reverse()
+    return path
 
 def find_path_between_concepts(graph_data, concept1, concept2):
     """
@@ -48,62 +266,37 @@ def find_path_between_concepts(graph_data, concept1, concept2):
     concept1_id = concept1.lower().replace(' ', '_')
     concept2_id = concept2.lower().replace(' ', '_')
     
-    nodes = graph_data.get('nodes', [])
-    edges = graph_data.get('edges', [])
+    graph, edge_labels, label_index, _, csr = _build_adj(graph_data)
     
     # Check if both concepts exist
-    node_ids = {n['id'] for n in nodes}
-    if concept1_id not in node_ids or concept2_id not in node_ids:
+    if concept1_id not in label_index or concept2_id not in label_index:
         return None
     
-    # Build adjacency list
-    graph = {}
-    edge_labels = {}
-    
-    for edge in edges:
-        source = edge.get('source', '')
-        target = edge.get('target', '')
-        label = edge.get('label', 'related')
-        
-        if source not in graph:
-            graph[source] = []
-        if target not in graph:
-            graph[target] = []
+    if csr is not None and concept1_id in csr[3] and concept2_id in csr[3]:
+        # Large graph: BFS over int indices in compiled code
+        indptr, indices, ids, id_to_idx = csr
+        idx_path = _bfs_path_csr(indptr, indices, id_to_idx[concept1_id], id_to_idx[concept2_id])
+        if len(idx_path) == 0:
+            return None  # No path found
+        path = [ids[i] for i in idx_path]
+    else:
+        path = _bfs_path(graph, concept1_id, concept2_id)
+        if path is None:
+            return None  # No path found
+    
+    # Found path, format with labels
+    formatted_path = []
+    for i in range(len(path)):
+        node_label = _lookup_label(label_index, path[i])
+        formatted_path.append(node_label)
         
-        graph[source].append(target)
-        graph[target].append(source)  # Undirected
-        
-        edge_labels[(source, target)] = label
-        edge_labels[(target, source)] = label
-    
-    # BFS to find shortest path
-    queue = deque([(concept1_id, [concept1_id])])
-    visited = {concept1_id}
+        if i < len(path) - 1:
+            edge_key = (path[i], path[i+1])
+            relation = edge_labels.get(edge_key, 'related')
+            formatted_path.append(f"[{relation}]")
     
-    while queue:
-        current, path = queue.popleft()
-        
-        if current == concept2_id:
-            # Found path, format with labels
-            formatted_path = []
-            for i in range(len(path)):
-                node_label = get_node_label(path[i], nodes)
-                formatted_path.append(node_label)
-                
-                if i < len(path) - 1:
-                    edge_key = (path[i], path[i+1])
-                    relation = edge_labels.get(edge_key, 'related')
-                    formatted_path.append(f"[{relation}]")
-            
-            return formatted_path
-        
-        # Explore neighbors
-        for neighbor in graph.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append((neighbor, path + [neighbor]))
-    
-    return None  # No path found
+    return formatted_path
+
 
 def get_concept_neighbors(graph_data, concept, hops=1):
     """
@@ -118,28 +311,22 @@ def get_concept_neighbors(graph_data, concept, hops=1):
         List of (neighbor_concept, relationship, distance) tuples
     """
     concept_id = concept.lower().replace(' ', '_')
-    nodes = graph_data.get('nodes', [])
-    edges = graph_data.get('edges', [])
     
-    # Build adjacency list
-    graph = {}
-    edge_labels = {}
+    if hops == 1:
+        return _direct_neighbors(graph_data, concept_id)
     
-    for edge in edges:
-        source = edge.get('source', '')
-        target = edge.get('target', '')
-        label = edge.get('label', 'related')
-        
-        if source not in graph:
-            graph[source] = []
-        if target not in graph:
-            graph[target] = []
-        
-        graph[source].append(target)
-        graph[target].append(source)
-        
-        edge_labels[(source, target)] = label
-        edge_labels[(target, source)] = label
+    graph, edge_labels, label_index, _, csr = _build_adj(graph_data)
+    
+    if csr is not None and concept_id in csr[3]:
+        # Large graph: BFS over int indices in compiled code
+        indptr, indices, ids, id_to_idx = csr
+        order, found_by, dist = _bfs_neighbors_csr(indptr, indices, id_to_idx[concept_id], hops)
+        neighbors = []
+        for node, found in zip(order, found_by):
+            neighbor, current = ids[node], ids[found]
+            relation = edge_labels.get((current, neighbor), 'related')
+            neighbors.append((_lookup_label(label_index, neighbor), relation, int(dist[node])))
+        return neighbors
     
     # BFS with distance tracking
     neighbors = []
@@ -156,12 +343,44 @@ def get_concept_neighbors(graph_data, concept, hops=1):
             if neighbor not in visited:
                 visited.add(neighbor)
                 relation = edge_labels.get((current, neighbor), 'related')
-                neighbor_label = get_node_label(neighbor, nodes)
+                neighbor_label = _lookup_label(label_index, neighbor)
                 neighbors.append((neighbor_label, relation, dist + 1))
                 queue.append((neighbor, dist + 1))
     
     return neighbors
 
+def _direct_neighbors(graph_data, concept_id):
+    """
+    1-hop neighbors from a single scan over the edges, without building the adjacency
+    
+    Same result as the BFS: neighbors in first-seen order, the last edge between a
+    pair supplies the relation, and self-loops are skipped.
+    """
+    found = {}  # neighbor id -> relation
+    for edge in graph_data.get('edges', []):
+        source = edge.get('source', '')
+        target = edge.get('target', '')
+        if source == concept_id:
+            other = target
+        elif target == concept_id:
+            other = source
+        else:
+            continue
+        if other != concept_id:
+            found[other] = edge.get('label', 'related')
+    
+    if not found:
+        return []
+    
+    # Labels for the neighbors only; first node wins for duplicate ids
+    label_index = {}
+    for node in graph_data.get('nodes', []):
+        node_id = node.get('id')
+        if node_id in found and node_id not in label_index:
+            label_index[node_id] = node.get('label', node_id)
+    
+    return [(_lookup_label(label_index, neighbor), relation, 1) for neighbor, relation in found.items()]
+
 def summarize_graph_for_concept(graph_data, concept):
     """
     Create human-readable summary for a concept
@@ -195,6 +414,52 @@ def get_node_label(node_id, nodes):
             return node.get('label', node_id)
     return node_id.replace('_', ' ').title()
 
+def _build_concept_matcher(concepts):
+    """
+    Build a single-pass matcher for a tuple of concepts
+    
+    Returns:
+        Function mapping a lowercased question to the set of matching positions in concepts
+    """
+    words = {}  # lowercase concept -> positions in concepts
+    for i, concept in enumerate(concepts):
+        words.setdefault(concept.lower(), []).append(i)
+    
+    # An empty concept is a substring of every question
+    always = set(words.pop('', []))
+    if not words:
+        return lambda question_lower: set(always)
+    
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for word, positions in words.items():
+            automaton.add_word(word, positions)
+        automaton.make_automaton()
+        
+        def find(question_lower):
+            hits = set(always)
+            for _, positions in automaton.iter(question_lower):
+                hits.update(positions)
+            return hits
+        return find
+    
+    # The zero-width lookahead tries every offset, so overlapping mentions are seen.
+    # Only the longest word starting at an offset is captured; the shorter concepts it
+    # starts with are added from the precomputed prefix table.
+    ordered = sorted(words, key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(re.escape(w) for w in ordered) + '))')
+    prefixed = {
+        word: [i for other in words if word.startswith(other) for i in words[other]]
+        for word in words
+    }
+    
+    def find(question_lower):
+        hits = set(always)
+        for match in pattern.finditer(question_lower):
+            hits.update(prefixed[match.group(1)])
+        return hits
+    return find
+
 def extract_concepts_from_question(question, known_concepts):
     """
     Extract concept keywords from question
@@ -206,11 +471,18 @@ def extract_concepts_from_question(question, known_concepts):
     Returns:
         List of concepts mentioned in question
     """
-    question_lower = question.lower()
-    mentioned = []
-    
-    for concept in known_concepts:
-        if concept.lower() in question_lower:
-            mentioned.append(concept)
-    
-    return mentioned
\ No newline at end of file
+    if not known_concepts:
+        return []
+    
+    key = tuple(known_concepts)
+    find = _MATCHER_CACHE.get(key)
+    if find is None:
+        find = _build_concept_matcher(key)
+        with _CACHE_LOCK:
+            if len(_MATCHER_CACHE) >= _MATCHER_CACHE_MAX:
+                _MATCHER_CACHE.pop(next(iter(_MATCHER_CACHE)))
+            _MATCHER_CACHE[key] = find
+    
+    # One sweep over the question; keep the known_concepts order
+    hits = find(question.lower())
+    return [key[i] for i in sorted(hits)]
\ No newline at end of file
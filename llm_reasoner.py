@@ -2,23 +2,95 @@
 LLM Reasoner Module
 Loads TinyLlama-1.1B-Chat once at startup and generates answers
 """
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import os
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
 import torch
 
+# llama.cpp is optional - when installed, the 4-bit GGUF build is used instead of FP32 weights
+try:
+    from llama_cpp import Llama
+except ImportError:
+    Llama = None
+
+MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+GGUF_REPO = "TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF"
+GGUF_FILE = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
+
+USER_TAG = "<|user|>"
+
+# Context window of the model; creative retellings pass a smaller budget
+MAX_INPUT_TOKENS = 2048
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful story analysis assistant who provides detailed, accurate answers in English. Always respond in English language only, never in Hindi, Japanese, Chinese, or any other language."
+
 # Global variables to store model and tokenizer
 model = None
 tokenizer = None
 device = None
+backend = None  # "llama_cpp" or "transformers"
+
+# One model instance serves every request thread; generations take turns on it
+generation_lock = threading.Lock()
+
+# Prefilled KV cache per static system segment: {system_prompt: (input_ids, past_key_values)}
+prefix_cache = {}
+
+# Generated answers keyed by a digest of the prompt and generation settings, in LRU order
+# Lookups happen outside generation_lock, so the cache has its own lock
+_ANSWER_CACHE = OrderedDict()
+_ANSWER_CACHE_MAX = 256
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+def load_gguf_model():
+    """Load the Q4_K_M GGUF build through llama.cpp (int8/int4 dot products on CPU)"""
+    global model, tokenizer, device, backend
+    
+    from huggingface_hub import hf_hub_download
+    
+    print(f"Loading {GGUF_FILE} via llama.cpp...")
+    model_path = hf_hub_download(repo_id=GGUF_REPO, filename=GGUF_FILE)
+    
+    model = Llama(
+        model_path=model_path,
+        n_ctx=2048,
+        n_threads=os.cpu_count(),
+        n_batch=512,
+        verbose=False
+    )
+    tokenizer = None
+    device = "cpu"
+    backend = "llama_cpp"
 
 def load_model():
     """Load TinyLlama model once at startup"""
-    global model, tokenizer, device
+    global model, tokenizer, device, backend
     
     print("\n" + "="*60)
     print("Loading TinyLlama-1.1B-Chat-v1.0...")
     print("="*60)
     
-    model_name = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+    # Prefer the quantized llama.cpp backend when it is installed
+    if Llama is not None:
+        try:
+            load_gguf_model()
+            print("✓ Quantized GGUF model loaded successfully!")
+            print("="*60 + "\n")
+            return
+        except Exception as e:
+            print(f"✗ Error loading GGUF model: {e}")
+            print("Falling back to transformers...")
     
     try:
         # Determine device
@@ -27,23 +99,36 @@ def load_model():
         
         # Load tokenizer
         print("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
         
         # Set padding token to eos token
         if tokenizer.pad_token is None:
             tokenizer.pad_token = tokenizer.eos_token
         
         # Load model (no quantization for Windows compatibility)
-        print("Loading model...")
+        # bfloat16 on GPU halves memory traffic and runs on tensor cores
+        dtype = torch.bfloat16 if device == "cuda" else torch.float32
+        print(f"Loading model ({dtype})...")
         model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float32,  # Use float32 for CPU
-            low_cpu_mem_usage=True
+            MODEL_NAME,
+            torch_dtype=dtype,
+            attn_implementation="sdpa",
+            low_cpu_mem_usage=True,
+            use_safetensors=True  # mmap-loaded, matches what down.py prefetches
         )
         
         # Move to device and set to eval mode
         model.to(device)
         model.eval()
+        backend = "transformers"
+        
+        # Fuse kernels on GPU; generate() calls model.forward, so compile that
+        if device == "cuda":
+            try:
+                model.forward = torch.compile(model.forward, mode="reduce-overhead")
+                print("✓ torch.compile enabled")
+            except Exception as e:
+                print(f"⚠️  torch.compile unavailable, running eager: {e}")
         
         print("✓ Model loaded successfully!")
         print("="*60 + "\n")
@@ -53,68 +138,224 @@ def load_model():
         print("Continuing without LLM support...")
         model = None
         tokenizer = None
+        backend = None
+
+def autocast_context():
+    """bf16 autocast on GPU, no-op on CPU"""
+    if device == "cuda":
+        return torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+    return nullcontext()
+
+def format_system_segment(system_prompt):
+    """Static chat-template prefix - identical across calls, so its KV cache can be reused"""
+    return f"<|system|>\n{system_prompt}</s>\n"
+
+def format_user_segment(prompt):
+    """Dynamic chat-template suffix holding the story/question prompt"""
+    return f"{USER_TAG}\n{prompt}</s>\n<|assistant|>\n"
+
+def get_prefix_cache(system_prompt):
+    """Return (input_ids, past_key_values) for a system segment, prefilling it on first use"""
+    if system_prompt not in prefix_cache:
+        sys_ids = tokenizer(format_system_segment(system_prompt), return_tensors="pt").input_ids.to(device)
+        with torch.inference_mode(), autocast_context():
+            out = model(input_ids=sys_ids, use_cache=True)
+        prefix_cache[system_prompt] = (sys_ids, out.past_key_values)
+    return prefix_cache[system_prompt]
+
+def warm_prefix_cache(system_prompts):
+    """Prefill the KV cache for the given system prompts (called at startup)"""
+    if backend != "transformers":
+        return
+    for system_prompt in system_prompts:
+        try:
+            sys_ids, _ = get_prefix_cache(system_prompt)
+            print(f"✓ Cached {sys_ids.shape[1]}-token system prefix")
+        except Exception as e:
+            print(f"⚠️  Could not prefill system prefix: {e}")
+
+def build_input_ids(prompt, system_prompt, max_input_tokens=MAX_INPUT_TOKENS, user_ids=None):
+    """
+    Token ids for the full chat prompt plus a fresh copy of the cached system-prefix KV
+    
+    Only the dynamic user segment is tokenized; the system segment comes from the cache.
+    Pre-tokenized user_ids (see prompt_cache) skip tokenizing the prompt string.
+    No padding for a single sequence, so the real prompt length sizes the KV cache.
+    Over-long prompts lose the start of their body but keep the <|user|> tag and the
+    question/assistant tail. generate() extends the KV cache in place, so every call
+    gets its own copy.
+    """
+    sys_ids, sys_kv = get_prefix_cache(system_prompt)
+    if user_ids is None:
+        user_ids = tokenizer(
+            format_user_segment(prompt),
+            return_tensors="pt",
+            add_special_tokens=False
+        ).input_ids
+    user_ids = user_ids.to(device)
+    
+    budget = max_input_tokens - sys_ids.shape[1]
+    if user_ids.shape[1] > budget:
+        n_tag = len(tokenizer(USER_TAG, add_special_tokens=False).input_ids)
+        user_ids = torch.cat([user_ids[:, :n_tag], user_ids[:, -(budget - n_tag):]], dim=1)
+    
+    input_ids = torch.cat([sys_ids, user_ids], dim=1)
+    return input_ids, sys_ids.shape[1], copy.deepcopy(sys_kv)
+
+def build_gguf_tokens(prompt, system_prompt, max_new_tokens, max_input_tokens=MAX_INPUT_TOKENS):
+    """
+    Token ids of the full chat prompt for the llama.cpp backend
+    
+    Cut like build_input_ids: over-long prompts lose the start of their body but keep
+    the system segment, the <|user|> tag and the question/assistant tail. The prompt
+    stays within max_input_tokens, and within the context window left after
+    max_new_tokens. Tokenized the way llama.cpp tokenizes a string prompt (BOS first,
+    special tokens such as </s> recognised).
+    """
+    sys_ids = model.tokenize(format_system_segment(system_prompt).encode("utf-8"), add_bos=True, special=True)
+    user_ids = model.tokenize(format_user_segment(prompt).encode("utf-8"), add_bos=False, special=True)
+    
+    budget = min(max_input_tokens, model.n_ctx() - max_new_tokens) - len(sys_ids)
+    if len(user_ids) > budget:
+        n_tag = len(model.tokenize(USER_TAG.encode("utf-8"), add_bos=False, special=True))
+        user_ids = user_ids[:n_tag] + user_ids[len(user_ids) - (budget - n_tag):]
+    
+    return sys_ids + user_ids
+
+def generation_kwargs(input_ids, past_key_values, max_new_tokens, temperature, creative=False):
+    """
+    Decoding settings for model.generate() on the transformers backend
+    
+    Analytical answers decode greedily, with no_repeat_ngram_size instead of
+    repetition_penalty against loops, so temperature does not apply to them.
+    Retellings keep sampling; top_k bounds the candidate pool.
+    """
+    kwargs = dict(
+        input_ids=input_ids,
+        attention_mask=torch.ones_like(input_ids),
+        past_key_values=past_key_values,
+        max_new_tokens=max_new_tokens,
+        num_beams=1,
+        use_cache=True,
+        repetition_penalty=1.0,
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id
+    )
+    if creative:
+        kwargs.update(do_sample=True, temperature=temperature, top_k=40, top_p=0.9)
+    else:
+        kwargs.update(do_sample=False, no_repeat_ngram_size=4)
+    return kwargs
 
-def generate_answer(prompt, max_new_tokens=400, temperature=0.7):
+def gguf_kwargs(max_new_tokens, temperature, creative=False):
+    """Decoding settings for the llama.cpp backend (greedy for analytical answers)"""
+    kwargs = dict(
+        max_tokens=max_new_tokens,
+        repeat_penalty=1.0,
+        stop=["</s>"]
+    )
+    if creative:
+        kwargs.update(temperature=temperature, top_k=40, top_p=0.9)
+    else:
+        kwargs.update(temperature=0.0)
+    return kwargs
+
+def answer_cache_key(prompt, system_prompt, max_new_tokens, temperature, max_input_tokens, creative=False):
+    """Digest of everything that shapes a generated answer"""
+    key = "\0".join((backend or "", system_prompt, prompt, str(max_new_tokens), str(temperature),
+                     str(max_input_tokens), str(creative)))
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+def get_cached_answer(key):
+    """Return a cached answer (marking it most recently used) or None"""
+    with _ANSWER_CACHE_LOCK:
+        answer = _ANSWER_CACHE.get(key)
+        if answer is not None:
+            _ANSWER_CACHE.move_to_end(key)
+    return answer
+
+def store_answer(key, answer):
+    """Cache an answer, evicting the least recently used one when full"""
+    with _ANSWER_CACHE_LOCK:
+        _ANSWER_CACHE[key] = answer
+        _ANSWER_CACHE.move_to_end(key)
+        if len(_ANSWER_CACHE) > _ANSWER_CACHE_MAX:
+            _ANSWER_CACHE.popitem(last=False)
+
+class StopOnEvent(StoppingCriteria):
+    """Stops generate() once the streaming consumer has gone away"""
+    def __init__(self, event):
+        self.event = event
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+def generate_answer(prompt, max_new_tokens=400, temperature=0.7, system_prompt=None,
+                    max_input_tokens=MAX_INPUT_TOKENS, user_ids=None, use_cache=True, creative=False):
     """
     Generate answer from prompt using TinyLlama
     
     Args:
         prompt: Context + question prompt
         max_new_tokens: Maximum tokens to generate (increased to 400 for complete answers)
-        temperature: Sampling temperature (0.7 = balanced)
+        temperature: Sampling temperature for creative answers (0.7 = balanced)
+        system_prompt: Static instructions sent as the system segment (default: English-only assistant)
+        max_input_tokens: Prompt token budget including the system segment
+        user_ids: Optional pre-tokenized user segment for the prompt (transformers backend)
+        use_cache: Reuse/store the answer for an identical prompt (pass False to resample)
+        creative: Sample a retelling instead of decoding an analytical answer greedily
     
     Returns:
         Generated answer string
     """
-    global model, tokenizer, device
-    
-    if model is None or tokenizer is None:
+    if model is None or (backend == "transformers" and tokenizer is None):
         return "LLM not available. Please check model loading."
     
+    if system_prompt is None:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+    
+    # Identical prompts (e.g. the same story and question in another session) skip generation
+    cache_key = answer_cache_key(prompt, system_prompt, max_new_tokens, temperature, max_input_tokens, creative)
+    if use_cache:
+        cached = get_cached_answer(cache_key)
+        if cached is not None:
+            print("✓ Answer cache hit - skipping generation")
+            return cached
+    
     try:
-        # Format prompt for chat model - emphasize English language
-        chat_prompt = f"<|system|>\nYou are a helpful story analysis assistant who provides detailed, accurate answers in English. Always respond in English language only, never in Hindi, Japanese, Chinese, or any other language.</s>\n<|user|>\n{prompt}</s>\n<|assistant|>\n"
-        
-        # Tokenize with attention_mask
-        inputs = tokenizer(
-            chat_prompt, 
-            return_tensors="pt", 
-            truncation=True, 
-            max_length=2048,
-            padding=True,
-            return_attention_mask=True
-        )
-        inputs = inputs.to(device)
+        if backend == "llama_cpp":
+            # llama.cpp keeps the evaluated tokens of the previous call, so the
+            # shared system segment at the front of the prompt is not re-evaluated
+            with generation_lock:
+                prompt_tokens = build_gguf_tokens(prompt, system_prompt, max_new_tokens, max_input_tokens)
+                answer = generate_answer_gguf(prompt_tokens, max_new_tokens, temperature, creative)
+            if use_cache:
+                store_answer(cache_key, answer)
+            return answer
+        
+        input_ids, n_cached, past_key_values = build_input_ids(prompt, system_prompt, max_input_tokens, user_ids)
         
         print(f"⚙️  Generating answer (this may take 1-5 minutes on CPU)...")
-        print(f"⚙️  Processing {inputs.input_ids.shape[1]} input tokens...")
+        print(f"⚙️  Processing {input_ids.shape[1]} input tokens ({n_cached} cached)...")
         
-        import time
         start_time = time.time()
         
-        # Generate with attention mask
-        with torch.no_grad():
-            outputs = model.generate(
-                input_ids=inputs.input_ids,
-                attention_mask=inputs.attention_mask,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                do_sample=True,
-                top_p=0.9,
-                repetition_penalty=1.1,  # Reduce repetition
-                pad_token_id=tokenizer.pad_token_id,
-                eos_token_id=tokenizer.eos_token_id
-            )
+        # Generate with attention mask (bf16 autocast on GPU)
+        with generation_lock, torch.inference_mode(), autocast_context():
+            outputs = model.generate(**generation_kwargs(input_ids, past_key_values, max_new_tokens, temperature, creative))
         
         elapsed = time.time() - start_time
         
         # Decode only the new tokens
-        generated_text = tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+        generated_text = tokenizer.decode(outputs[0][input_ids.shape[1]:], skip_special_tokens=True)
         
-        tokens_generated = outputs[0].shape[0] - inputs.input_ids.shape[1]
+        tokens_generated = outputs[0].shape[0] - input_ids.shape[1]
         print(f"✓ Generated {tokens_generated} tokens in {elapsed:.1f}s ({tokens_generated/elapsed:.1f} tokens/sec)")
         
-        return generated_text.strip()
+        answer = generated_text.strip()
+        if use_cache:
+            store_answer(cache_key, answer)
+        return answer
         
     except Exception as e:
         print(f"✗ Error generating answer: {e}")
@@ -122,6 +363,109 @@ def generate_answer(prompt, max_new_tokens=400, temperature=0.7):
         traceback.print_exc()
         return "I encountered an error generating the answer. Please try again."
 
-def initialize_model():
+def generate_answer_stream(prompt, max_new_tokens=400, temperature=0.7, system_prompt=None,
+                           max_input_tokens=MAX_INPUT_TOKENS, user_ids=None, use_cache=True, creative=False):
+    """
+    Stream an answer from TinyLlama as it is generated
+    
+    Same arguments as generate_answer. Closing the generator early (e.g. after a
+    stop sequence or sentence limit) stops generation at the next token. A cached
+    answer is yielded as a single chunk; streamed answers are not stored, since the
+    consumer may cut them short.
+    
+    Yields:
+        Text chunks in generation order
+    """
+    if model is None or (backend == "transformers" and tokenizer is None):
+        yield "LLM not available. Please check model loading."
+        return
+    
+    if system_prompt is None:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+    
+    if use_cache:
+        cached = get_cached_answer(answer_cache_key(prompt, system_prompt, max_new_tokens, temperature,
+                                                    max_input_tokens, creative))
+        if cached is not None:
+            print("✓ Answer cache hit - skipping generation")
+            yield cached
+            return
+    
+    start_time = time.time()
+    chars_streamed = 0
+    
+    # Held until the stream finishes or the consumer closes it
+    generation_lock.acquire()
+    try:
+        if backend == "llama_cpp":
+            prompt_tokens = build_gguf_tokens(prompt, system_prompt, max_new_tokens, max_input_tokens)
+            print("⚙️  Streaming answer with quantized GGUF model...")
+            for chunk in model(prompt_tokens, stream=True, **gguf_kwargs(max_new_tokens, temperature, creative)):
+                text = chunk["choices"][0]["text"]
+                chars_streamed += len(text)
+                yield text
+        else:
+            input_ids, n_cached, past_key_values = build_input_ids(prompt, system_prompt, max_input_tokens, user_ids)
+            print(f"⚙️  Streaming answer from {input_ids.shape[1]} input tokens ({n_cached} cached)...")
+            
+            streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            stop_event = threading.Event()
+            kwargs = generation_kwargs(input_ids, past_key_values, max_new_tokens, temperature, creative)
+            kwargs["streamer"] = streamer
+            kwargs["stopping_criteria"] = StoppingCriteriaList([StopOnEvent(stop_event)])
+            
+            errors = []
+            
+            def run_generate():
+                # inference_mode/autocast are thread-local, so enter them on the worker thread
+                try:
+                    with torch.inference_mode(), autocast_context():
+                        model.generate(**kwargs)
+                except Exception as e:
+                    errors.append(e)
+                    streamer.end()  # unblock the consumer
+            
+            thread = threading.Thread(target=run_generate, daemon=True)
+            thread.start()
+            try:
+                for text in streamer:
+                    chars_streamed += len(text)
+                    yield text
+            finally:
+                stop_event.set()
+                thread.join()
+            
+            if errors:
+                raise errors[0]
+        
+        elapsed = time.time() - start_time
+        print(f"✓ Streamed {chars_streamed} characters in {elapsed:.1f}s")
+        
+    except Exception as e:
+        print(f"✗ Error generating answer: {e}")
+        import traceback
+        traceback.print_exc()
+        yield "I encountered an error generating the answer. Please try again."
+    finally:
+        generation_lock.release()
+
+def generate_answer_gguf(prompt_tokens, max_new_tokens, temperature, creative=False):
+    """Generate with the llama.cpp backend from build_gguf_tokens() ids"""
+    start_time = time.time()
+    
+    print("⚙️  Generating answer with quantized GGUF model...")
+    
+    output = model(prompt_tokens, **gguf_kwargs(max_new_tokens, temperature, creative))
+    
+    elapsed = time.time() - start_time
+    
+    generated_text = output["choices"][0]["text"]
+    tokens_generated = output["usage"]["completion_tokens"]
+    print(f"✓ Generated {tokens_generated} tokens in {elapsed:.1f}s ({tokens_generated/max(elapsed, 1e-6):.1f} tokens/sec)")
+    
+    return generated_text.strip()
+
+def initialize_model(system_prompts=()):
     """Public function to initialize model (called at startup)"""
-    load_model()
\ No newline at end of file
+    load_model()
+    warm_prefix_cache((DEFAULT_SYSTEM_PROMPT,) + tuple(system_prompts))
\ No newline at end of file
@@ -2,19 +2,86 @@
 Physics Validator Module
 Detects violations of fundamental physics laws in story text
 """
+import hashlib
+import html
+import io
 import re
-from typing import List, Dict, Tuple
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from typing import List, Dict, Tuple, Iterable, Optional
 
-# Physics violation patterns organized by category
+# pyahocorasick is optional - without it anchor words are found with one compiled regex
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# pyarrow is optional - check_stories_physics uses its vectorized string kernels to
+# skip stories without any anchor word in one pass over the whole batch
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+# hyperscan is optional - one SIMD pass over the text reports exactly which patterns match,
+# replacing the anchor-word pre-filter
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# numpy is optional - find_violation_spans returns spans as an array when it is installed
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# numba is optional - it JIT-compiles the anchor-word scan used when neither hyperscan
+# nor pyahocorasick is installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# google-re2 is optional - its linear-time engine runs every pattern it supports,
+# and patterns using lookarounds (which RE2 rejects) stay on re
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# Syntax RE2 does not implement
+_RE2_UNSUPPORTED = ("(?=", "(?!", "(?<=", "(?<!")
+
+# Atomic groups (?>...) reached re in Python 3.11. They only prune backtracking in the
+# patterns below (never change what matches), so they are compiled as (?:...) on older
+# Pythons and on RE2, which never backtracks.
+_ATOMIC_GROUPS = sys.version_info >= (3, 11)
+
+# Upward destination shared by the upward-motion and falling-upward patterns
+_UP = r'(?>up(?:ward)?|into\s+(?:the\s+)?(?>sky|air|ceiling))'
+_UP_MOTION = rf'\s+{_UP}\b'
+
+# Physics violation patterns organized by category: (pattern, description) or
+# (pattern, description, exceptions). A match is dropped when the exceptions regex
+# matches later in the same sentence, starting within _EXCEPTION_WINDOW characters
+# (checked in Python after the match, so the patterns themselves need no lookaheads).
+# Gaps between keywords are bounded lazy spans (.{0,120}?), so a failed match costs at
+# most a bounded window per start position instead of backtracking over the whole line.
+# Keyword alternations that are followed by \b are atomic groups: no alternative is a
+# prefix of another, so once one matched there is nothing useful to backtrack into.
 PHYSICS_VIOLATIONS = {
     "gravity": {
         "name": "Gravity Violations",
         "patterns": [
             # Upward motion without force
-            (r'\b(flew|floated|rose|lifted|ascended)\s+(?:up(?:ward)?|into\s+(?:the\s+)?(?:sky|air|ceiling))\b(?!.*(?:pulled|pushed|threw|tossed|jumped|rocket|balloon|bird|plane|helicopter))', 
-             "Upward motion without apparent force or mechanism"),
+            (rf'\b(flew|floated|rose|lifted|ascended){_UP_MOTION}', 
+             "Upward motion without apparent force or mechanism",
+             r'pulled|pushed|threw|tossed|jumped|rocket|balloon|bird|plane|helicopter'),
             # Objects falling upward
-            (r'\b(?:fell|dropped|shot)\s+(?:up(?:ward)?|into\s+(?:the\s+)?(?:sky|air|ceiling))\b',
+            (rf'\b(?:fell|dropped|shot){_UP_MOTION}',
              "Objects falling upward instead of down"),
             # Reversed gravity
             (r'\b(?:gravity|pull)\s+(?:reversed|backwards|upward|inverted)\b',
@@ -31,7 +98,7 @@ PHYSICS_VIOLATIONS = {
         "name": "Conservation of Energy Violations",
         "patterns": [
             # Energy from nothing
-            (r'\bwithout\s+(?:any\s+)?(?:fuel|power|battery|batteries|energy|source|electricity|wires)\b.*\b(?:lit\s+up|powered|ran|worked|glowed|shone)\b',
+            (r'\bwithout\s+(?:any\s+)?(?>fuel|power|batter(?:y|ies)|energy|source|electricity|wires)\b.{0,120}?\b(?>lit\s+up|powered|ran|worked|glowed|shone)\b',
              "Energy appearing from nowhere"),
             # Perpetual motion
             (r'\b(?:running|spinning|moving|working)\s+(?:for\s+)?(?:\d+\s+)?(?:years?|centuries|forever|continuously|endlessly)\s+(?:without|on\s+its\s+own)\b',
@@ -45,8 +112,9 @@ PHYSICS_VIOLATIONS = {
         "name": "Conservation of Mass Violations",
         "patterns": [
             # Disappearing matter
-            (r'\b(?:vanished|disappeared|evaporated)\s+(?:without|into\s+(?:thin\s+)?air)\b(?!.*(?:magic|illusion|trick))',
-             "Matter disappearing without explanation"),
+            (r'\b(?:vanished|disappeared|evaporated)\s+(?:without|into\s+(?:thin\s+)?air)\b',
+             "Matter disappearing without explanation",
+             r'magic|illusion|trick'),
             # Duplicating matter
             (r'\b(?:duplicate|copy|copies|clone|clones|multiplied)\s+(?:popped|appeared|materialized)\b',
              "Matter duplicating spontaneously"),
@@ -59,13 +127,13 @@ PHYSICS_VIOLATIONS = {
         "name": "Thermodynamics Violations",
         "patterns": [
             # Heat flowing wrong direction
-            (r'\b(?:ice|frozen|cold)\b.*\b(?:in\s+(?:the\s+)?(?:sun|heat|fire|hot))\b.*\b(?:froze|colder|freeze|harder)\b',
+            (r'\b(?:ice|frozen|cold)\b.{0,120}?\b(?:in\s+(?:the\s+)?(?:sun|heat|fire|hot))\b.{0,120}?\b(?:froze|colder|freeze|harder)\b',
              "Heat flowing from cold to hot (2nd law violation)"),
             # Instant temperature changes
             (r'\b(?:instantly|immediately|suddenly|within\s+(?:a\s+)?(?:second|moment))\s+(?:froze|melted|boiled|cooled|heated)\b',
              "Instantaneous temperature change"),
             # Temperature paradox
-            (r'\b(?:boiled|hot)\b.*\b(?:froze|frozen|ice)\b.*\b(?:flame|fire|burning)\b',
+            (r'\b(?:boiled|hot)\b.{0,120}?\b(?:froze|frozen|ice)\b.{0,120}?\b(?:flame|fire|burning)\b',
              "Simultaneous contradictory temperatures"),
         ]
     },
@@ -76,10 +144,11 @@ PHYSICS_VIOLATIONS = {
             (r'\b(?:faster\s+than|overtook|outran)\s+(?:light|beam)\b',
              "Faster-than-light travel"),
             # Time reversal
-            (r'\b(?:clocks?|time)\s+(?:ticked|ran|went|moved)\s+backwards?\b(?!.*(?:daylight\s+saving|reset|rewound))',
-             "Time flowing backwards"),
+            (r'\b(?:clocks?|time)\s+(?:ticked|ran|went|moved)\s+backwards?\b',
+             "Time flowing backwards",
+             r'daylight\s+saving|reset|rewound'),
             # Time paradox
-            (r'\bwalked\s+forward\b.*\bbackwards?\b.*\btime\b',
+            (r'\bwalked\s+forward\b.{0,120}?\bbackwards?\b.{0,120}?\btime\b',
              "Time direction inconsistency"),
         ]
     },
@@ -87,13 +156,13 @@ PHYSICS_VIOLATIONS = {
         "name": "Newton's Laws Violations",
         "patterns": [
             # Motion without force
-            (r'\b(?:suddenly|just)\s+(?:darted|moved|shot|accelerated)\b.*\b(?:no\s+one|nothing)\s+(?:touched|pushed|pulled)\b',
+            (r'\b(?:suddenly|just)\s+(?:darted|moved|shot|accelerated)\b.{0,120}?\b(?:no\s+one|nothing)\s+(?:touched|pushed|pulled)\b',
              "Motion without applied force (Newton's 1st law)"),
             # No recoil
-            (r'\b(?:fired|shot)\s+(?:a\s+)?(?:cannon|gun|rocket)\b.*\b(?:didn\'t|did\s+not)\s+(?:move|feel|push|recoil)\b',
+            (r'\b(?:fired|shot)\s+(?:a\s+)?(?:cannon|gun|rocket)\b.{0,120}?\b(?:didn\'t|did\s+not)\s+(?:move|feel|push|recoil)\b',
              "No recoil from firing projectile (Newton's 3rd law)"),
             # Stationary after collision
-            (r'\b(?:hit|struck|crashed\s+into)\b.*\b(?:didn\'t|did\s+not)\s+move\b',
+            (r'\b(?:hit|struck|crashed\s+into)\b.{0,120}?\b(?:didn\'t|did\s+not)\s+move\b',
              "No momentum transfer in collision"),
         ]
     },
@@ -101,10 +170,10 @@ PHYSICS_VIOLATIONS = {
         "name": "Material Strength Violations",
         "patterns": [
             # Impossible bending
-            (r'\b(?:steel|iron|metal|concrete|stone)\s+(?:bridge|beam|wall|rod)\s+(?:twisted|bent|folded)\b.*\b(?:clay|soft|gently|easily)\b',
+            (r'\b(?:steel|iron|metal|concrete|stone)\s+(?:bridge|beam|wall|rod)\s+(?:twisted|bent|folded)\b.{0,120}?\b(?:clay|soft|gently|easily)\b',
              "Impossible bending of rigid materials"),
             # Infinite strength
-            (r'\b(?:wooden|small|thin)\s+(?:stool|chair|stick|rod)\s+(?:held|supported)\b.*\b(?:building|elephant|train|truck)\b',
+            (r'\b(?:wooden|small|thin)\s+(?:stool|chair|stick|rod)\s+(?:held|supported)\b.{0,120}?\b(?:building|elephant|train|truck)\b',
              "Small structure supporting impossibly large load"),
         ]
     },
@@ -112,13 +181,14 @@ PHYSICS_VIOLATIONS = {
         "name": "Biological/Survival Violations",
         "patterns": [
             # No oxygen needed
-            (r'\b(?:underwater|submerged)\s+for\s+(?:\d+\s+)?(?:hours?|days?)\b(?!.*(?:submarine|scuba|tank|oxygen))',
-             "Surviving without oxygen for extended period"),
+            (r'\b(?:underwater|submerged)\s+for\s+(?:\d+\s+)?(?:hours?|days?)\b',
+             "Surviving without oxygen for extended period",
+             r'submarine|scuba|tank|oxygen'),
             # Indestructibility
-            (r'\b(?:train|truck|car|building)\s+(?:hit|struck|crashed)\b.*\b(?:didn\'t|did\s+not)\s+(?:move|injure|hurt)\b',
+            (r'\b(?:train|truck|car|building)\s+(?:hit|struck|crashed)\b.{0,120}?\b(?:didn\'t|did\s+not)\s+(?:move|injure|hurt)\b',
              "Human surviving unsurvivable impact"),
             # No injury from massive force
-            (r'\b(?:crumpled|fell\s+apart)\b.*\b(?:he|she)\s+(?:didn\'t|did\s+not)\s+move\b',
+            (r'\b(?:crumpled|fell\s+apart)\b.{0,120}?\b(?:he|she)\s+(?:didn\'t|did\s+not)\s+move\b',
              "No injury despite catastrophic collision"),
         ]
     },
@@ -126,10 +196,11 @@ PHYSICS_VIOLATIONS = {
         "name": "Planetary Physics Violations",
         "patterns": [
             # Orbit breaking
-            (r'\b(?:moon|planet|satellite)\s+(?:paused|stopped|drifted|left|departed)\b(?!.*orbit)',
-             "Celestial body leaving stable orbit"),
+            (r'\b(?:moon|planet|satellite)\s+(?:paused|stopped|drifted|left|departed)\b',
+             "Celestial body leaving stable orbit",
+             r'orbit'),
             # Atmosphere moving
-            (r'\batmosphere\b.*\b(?:blew|moved|shifted|drifted)\b',
+            (r'\batmosphere\b.{0,120}?\b(?:blew|moved|shifted|drifted)\b',
              "Entire atmosphere moving independently"),
         ]
     },
@@ -137,27 +208,436 @@ PHYSICS_VIOLATIONS = {
         "name": "Quantum Physics Violations",
         "patterns": [
             # Deterministic quantum
-            (r'\b(?:every\s+time|always)\b.*\b(?:electron|particle|quantum)\b.*\b(?:same\s+place|exact|identical)\b',
+            (r'\b(?:every\s+time|always)\b.{0,120}?\b(?:electron|particle|quantum)\b.{0,120}?\b(?:same\s+place|exact|identical)\b',
              "Deterministic quantum behavior (violates uncertainty principle)"),
             # Macroscopic tunneling
-            (r'\bwalked\s+(?:into|through)\s+(?:a\s+)?(?:wall|barrier)\b.*\b(?:emerged|came\s+out)\b.*\b(?:without|no)\s+(?:hole|damage)\b',
+            (r'\bwalked\s+(?:into|through)\s+(?:a\s+)?(?:wall|barrier)\b.{0,120}?\b(?:emerged|came\s+out)\b.{0,120}?\b(?:without|no)\s+(?:hole|damage)\b',
              "Macroscopic quantum tunneling"),
         ]
     }
 }
 
-def analyze_physics_violations(text: str) -> Dict:
+# Non-ASCII characters re.IGNORECASE matches against ASCII letters; translating them
+# before lowering keeps the folded text the same length as the original
+_ASCII_CASE_FOLDS = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+def _fold(text: str) -> str:
+    """
+    Lowercased copy of text that the patterns scan
+    
+    It has the same length as text, so match spans index the original directly, and it
+    holds a lowercase ASCII letter exactly where a case-insensitive pattern would match
+    one. The patterns are all lowercase, so they compile case-sensitively, and a
+    case-sensitive scan of the copy is several times faster than re.IGNORECASE.
+    """
+    return text.translate(_ASCII_CASE_FOLDS).lower()
+
+def _compile(pattern: str, use_re2: bool = True):
+    """Compile for _fold()ed text with RE2 when it is installed and supports the pattern, else re"""
+    plain = pattern.replace("(?>", "(?:")
+    if use_re2 and re2 is not None and not any(token in pattern for token in _RE2_UNSUPPORTED):
+        try:
+            return re2.compile(plain)
+        except re2.error:
+            pass
+    return re.compile(pattern if _ATOMIC_GROUPS else plain)
+
+# Every pattern compiled once at import, flattened in category order:
+# (category name, compiled pattern, description, compiled exceptions or None). Names and
+# descriptions are interned, so every violation dict shares them and category grouping
+# compares by identity first.
+_COMPILED_VIOLATIONS = [
+    (sys.intern(category_info["name"]), _compile(pattern), sys.intern(description),
+     _compile(exceptions[0]) if exceptions else None)
+    for category_info in PHYSICS_VIOLATIONS.values()
+    for pattern, description, *exceptions in category_info["patterns"]
+]
+
+# An exception must start within this many characters after the match
+_EXCEPTION_WINDOW = 120
+# Room past the window for an exception that starts inside it to finish matching
+_EXCEPTION_MAX_LEN = 40
+_SENTENCE_END = re.compile(r'[.!?]')
+
+def _explained(text: str, end: int, exceptions) -> bool:
+    """Whether exceptions match in the sentence after text[end], starting within the window"""
+    window_end = end + _EXCEPTION_WINDOW
+    search_end = window_end + _EXCEPTION_MAX_LEN
+    # Exceptions contain no sentence punctuation, so one never runs past the sentence end
+    stop = _SENTENCE_END.search(text, end, search_end)
+    found = exceptions.search(text, end, stop.start() if stop is not None else search_end)
+    return found is not None and found.start() <= window_end
+
+def _iter_matches(compiled, exceptions, text: str, pos: int):
+    """Like compiled.finditer(text, pos), skipping matches the exceptions explain away"""
+    if exceptions is None:
+        yield from compiled.finditer(text, pos)
+        return
+    
+    match = compiled.search(text, pos)
+    while match is not None:
+        if _explained(text, match.end(), exceptions):
+            # A rejected match does not consume its text - retry one character later
+            match = compiled.search(text, match.start() + 1)
+        else:
+            yield match
+            match = compiled.search(text, match.end())
+
+# _COMPILED_VIOLATIONS indices of each category's patterns
+_CATEGORY_INDICES = {}
+for _i, _category in enumerate(category for category, category_info in PHYSICS_VIOLATIONS.items()
+                               for _ in category_info["patterns"]):
+    _CATEGORY_INDICES.setdefault(_category, []).append(_i)
+
+def _merge_shared_suffixes(patterns: Iterable[str]) -> List[str]:
+    """
+    Merge patterns that differ only in their leading keyword group
+    
+    \\b(?:a|b)X and \\b(?:c)X become \\b(?:a|b|c)X, so an alternation of the patterns
+    tries the shared suffix once per position instead of once per pattern. The merged
+    list matches at the same positions as the original.
+    """
+    merged = {}  # suffix, or the whole pattern when it has no keyword group -> keywords
+    for pattern in patterns:
+        head = re.match(r'\\b\((?:\?:)?([a-z|]+)\)', pattern)
+        if head is None:
+            merged.setdefault(pattern, None)
+        else:
+            merged.setdefault(pattern[head.end():], []).append(head.group(1))
+    return [rf'\b(?:{"|".join(keywords)}){rest}' if keywords is not None else rest
+            for rest, keywords in merged.items()]
+
+def _fuse(patterns: Iterable[str]):
+    """Compile patterns as one alternation"""
+    # Always re: all the bounded spans together exhaust RE2's DFA memory budget, and its
+    # NFA fallback is slower than re on this alternation
+    return _compile("|".join(f"(?:{pattern})" for pattern in _merge_shared_suffixes(patterns)),
+                    use_re2=False)
+
+# All patterns fused into one alternation. One search finds the earliest position any
+# pattern matches at, so clean text is rejected in a single pass over it.
+_FUSED_VIOLATIONS = _fuse(pattern for category_info in PHYSICS_VIOLATIONS.values()
+                          for pattern, *_ in category_info["patterns"])
+
+# Fused alternation of a single category, compiled the first time it is selected
+_FUSED_BY_CATEGORY = {}
+
+def _get_fused(category: str):
+    """Fused pattern of one PHYSICS_VIOLATIONS category, compiled on first use"""
+    if category not in _FUSED_BY_CATEGORY:
+        _FUSED_BY_CATEGORY[category] = _fuse(
+            pattern for pattern, *_ in PHYSICS_VIOLATIONS[category]["patterns"])
+    return _FUSED_BY_CATEGORY[category]
+
+def _first_match_start(text: str, categories: Optional[List[str]]) -> Optional[int]:
+    """Earliest position any pattern of the selected categories matches at, or None"""
+    if categories is None:
+        gates = (_FUSED_VIOLATIONS,)
+    else:
+        gates = (_get_fused(category) for category in categories)
+    starts = [match.start() for match in (gate.search(text) for gate in gates) if match is not None]
+    return min(starts) if starts else None
+
+def _anchor_words(pattern: str):
+    """
+    Literal words one of which occurs in every match of pattern
+    
+    Every pattern starts with \\b and a keyword or a group of keyword alternatives,
+    so the literal start of each alternative is an anchor, and it starts a word.
+    Returns (word, whole) pairs, where whole means the anchor is the entire keyword
+    and ends a word as well, or None when an alternative has no literal start (the
+    pattern must then always be run).
+    """
+    group = re.match(r'\\b\((?:\?[:>])?', pattern)
+    if group is None:
+        word = _literal_prefix(pattern[2:]) if pattern.startswith('\\b') else None
+        return [(word, _ends_word(pattern[2 + len(word):]))] if word else None
+    
+    # Split the leading group on top-level '|'
+    alternatives = []
+    depth = 0
+    current = ""
+    rest = ""
+    for pos in range(group.end(), len(pattern)):
+        char = pattern[pos]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                rest = pattern[pos + 1:]
+                break
+            depth -= 1
+        elif char == "|" and depth == 0:
+            alternatives.append(current)
+            current = ""
+            continue
+        current += char
+    alternatives.append(current)
+    
+    words = []
+    for alternative in alternatives:
+        word = _literal_prefix(alternative)
+        if not word:
+            return None
+        words.append((word, _ends_word(alternative[len(word):] or rest)))
+    return words
+
+def _ends_word(fragment: str) -> bool:
+    """Whether a regex fragment following a keyword starts with a word boundary"""
+    return fragment.startswith(("\\s", "\\b"))
+
+def _literal_prefix(fragment: str) -> str:
+    """Leading letters of a regex fragment that every match contains (e.g. 'clock' for 'clocks?')"""
+    word = re.match(r'[a-z]+', fragment)
+    if word is None:
+        return ""
+    # A quantifier makes the last letter optional
+    if fragment[word.end():word.end() + 1] in ("?", "*", "{"):
+        return word.group(0)[:-1]
+    return word.group(0)
+
+def _collect_anchors():
+    """
+    Anchor words of every pattern
+    
+    Returns:
+        (anchors, always) - {(anchor word, whole): _COMPILED_VIOLATIONS indices} and
+        the set of indices of patterns without anchors
+    """
+    anchors = {}
+    always = set()
+    for i, (category_info, (pattern, *_)) in enumerate(
+            (info, entry) for info in PHYSICS_VIOLATIONS.values() for entry in info["patterns"]):
+        words = _anchor_words(pattern)
+        if words is None:
+            always.add(i)
+            continue
+        for anchor in words:
+            anchors.setdefault(anchor, []).append(i)
+    return anchors, always
+
+_ANCHORS, _UNANCHORED = _collect_anchors()
+
+def _word_char(char: str) -> bool:
+    """Whether re counts char as a word character for \\b"""
+    return char.isalnum() or char == "_"
+
+if njit is not None:
+    @njit(cache=True)
+    def _word_byte(byte):
+        return 48 <= byte <= 57 or 65 <= byte <= 90 or 97 <= byte <= 122 or byte == 95
+    
+    @njit(cache=True)
+    def _scan_anchors_jit(buf, first, order, words, starts, lengths, whole, hits):
+        """Set hits[k] for every anchor k starting a word in buf (and ending one if whole[k])"""
+        # UTF-8 bytes of non-ASCII characters count as non-word, which can only add hits
+        n = buf.shape[0]
+        for i in range(n):
+            if i > 0 and _word_byte(buf[i - 1]):
+                continue
+            byte = buf[i]
+            # Only anchors starting with this byte can start here
+            for j in range(first[byte], first[byte + 1]):
+                k = order[j]
+                end = i + lengths[k]
+                if hits[k] or end > n or (whole[k] and end < n and _word_byte(buf[end])):
+                    continue
+                matched = True
+                for m in range(1, lengths[k]):
+                    if buf[i + m] != words[starts[k] + m]:
+                        matched = False
+                        break
+                if matched:
+                    hits[k] = True
+    
+    # Compile (or load from the on-disk cache) now so the first story doesn't pay for it
+    _warm_first = np.zeros(257, dtype=np.int32)
+    _warm_first[98:] = 1
+    _scan_anchors_jit(np.frombuffer(b"ab", np.uint8), _warm_first, np.zeros(1, np.int32),
+                      np.frombuffer(b"ab", np.uint8), np.zeros(1, np.int32),
+                      np.full(1, 2, np.int32), np.ones(1, np.bool_), np.zeros(1, np.bool_))
+
+def _build_anchor_finder():
+    """
+    Build a single-pass scan for the anchor words of every pattern
+    
+    Returns:
+        Function mapping _fold()ed text to the set of _COMPILED_VIOLATIONS indices
+        whose anchors occur in it at the start of a word (whole anchors as a word)
+    """
+    anchors, always = _ANCHORS, _UNANCHORED
+    
+    if ahocorasick is not None:
+        # word -> (indices anchored by a prefix of a keyword, indices anchored by a whole keyword)
+        entries = {}
+        for (word, whole), indices in anchors.items():
+            entries.setdefault(word, ([], []))[whole].extend(indices)
+        automaton = ahocorasick.Automaton()
+        for word, (prefix, whole) in entries.items():
+            automaton.add_word(word, (len(word), prefix, whole))
+        automaton.make_automaton()
+        
+        def find(text):
+            candidates = set(always)
+            last = len(text) - 1
+            # The automaton also reports anchors inside longer words; those are skipped
+            for end, (length, prefix, whole) in automaton.iter(text):
+                start = end - length + 1
+                if start and _word_char(text[start - 1]):
+                    continue
+                candidates.update(prefix)
+                if whole and (end == last or not _word_char(text[end + 1])):
+                    candidates.update(whole)
+            return candidates
+        return find
+    
+    if njit is not None:
+        keys = list(anchors)
+        words = [word for word, _ in keys]
+        # Anchors grouped by first byte: order[first[b]:first[b + 1]] start with byte b
+        order = np.array(sorted(range(len(words)), key=lambda k: words[k]), dtype=np.int32)
+        first = np.searchsorted(np.array([ord(words[k][0]) for k in order]), np.arange(257)).astype(np.int32)
+        lengths = np.array([len(word) for word in words], dtype=np.int32)
+        starts = np.zeros(len(words), dtype=np.int32)
+        starts[1:] = np.cumsum(lengths)[:-1]
+        packed = np.frombuffer("".join(words).encode("ascii"), np.uint8)
+        whole = np.array([whole for _, whole in keys], dtype=np.bool_)
+        
+        def find(text):
+            hits = np.zeros(len(words), dtype=np.bool_)
+            _scan_anchors_jit(np.frombuffer(text.encode("utf-8", "replace"), np.uint8),
+                              first, order, packed, starts, lengths, whole, hits)
+            candidates = set(always)
+            for k in np.flatnonzero(hits):
+                candidates.update(anchors[keys[k]])
+            return candidates
+        return find
+    
+    # Each hit is the longest anchor starting a word there; the zero-width lookahead sees
+    # anchors that overlap it. Every anchor it starts with also starts the word, and
+    # whole ones are checked against the character after them.
+    words = sorted({word for word, _ in anchors}, key=len, reverse=True)
+    pattern = re.compile(r'\b(?=(' + '|'.join(words) + '))')
+    prefixed = {word: [(len(other), whole, indices) for (other, whole), indices in anchors.items()
+                       if word.startswith(other)]
+                for word in words}
+    
+    def find(text):
+        candidates = set(always)
+        end = len(text)
+        for match in pattern.finditer(text):
+            start = match.start()
+            for length, whole, indices in prefixed[match.group(1)]:
+                if not whole or start + length == end or not _word_char(text[start + length]):
+                    candidates.update(indices)
+        return candidates
+    return find
+
+_HYPERSCAN_CLASSES = re.compile(r'\\[wsd]')
+_HYPERSCAN_CLASS_MAP = {
+    r'\w': r'[\w\x{80}-\x{10FFFF}]',
+    r'\s': r'[\s\x1c-\x1f\x{80}-\x{10FFFF}]',
+    r'\d': r'[\d\x{80}-\x{10FFFF}]',
+}
+def _build_hyperscan_finder():
+    """
+    Build a Hyperscan scan reporting which patterns match a text
+    
+    Hyperscan finds every pattern with a match in one pass, so its candidates are close
+    to exact instead of every pattern sharing a word with the text. Exception words are
+    not part of the patterns and are still checked after the regex match.
+    
+    Returns:
+        Function mapping _fold()ed text to the set of _COMPILED_VIOLATIONS indices that
+        match it, or None when hyperscan is not installed or rejects a pattern
+    """
+    if hyperscan is None:
+        return None
+    
+    # Greediness and atomic groups only affect where re stops, not whether a pattern matches.
+    # Hyperscan rejects \b in Unicode mode, so classes are ASCII: widening \w, \s and \d to
+    # any non-ASCII character (and \s to the separators re also counts) keeps every re
+    # match a Hyperscan match.
+    expressions = [_HYPERSCAN_CLASSES.sub(lambda m: _HYPERSCAN_CLASS_MAP[m.group(0)],
+                                          pattern.replace("(?>", "(?:")).encode()
+                   for info in PHYSICS_VIOLATIONS.values() for pattern, *_ in info["patterns"]]
+    flags = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SINGLEMATCH
+    database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    try:
+        database.compile(expressions=expressions, ids=list(range(len(expressions))),
+                         flags=[flags] * len(expressions))
+    except hyperscan.error as e:
+        print(f"⚠ Hyperscan could not compile the physics patterns ({e}), using anchor words")
+        return None
+    
+    # Scratch space cannot be shared by concurrent scans - one per request thread
+    prototype = hyperscan.Scratch(database)
+    local = threading.local()
+    
+    def find(text):
+        scratch = getattr(local, "scratch", None)
+        if scratch is None:
+            scratch = local.scratch = prototype.clone()
+        candidates = set()
+        database.scan(text.encode("utf-8", "replace"),
+                      match_event_handler=lambda index, start, end, flags, context: candidates.add(index),
+                      scratch=scratch)
+        return candidates
+    return find
+
+# Patterns that can match a text: exact with Hyperscan, otherwise those whose anchor
+# words occur in it (the rest cannot match)
+_find_candidates = _build_hyperscan_finder() or _build_anchor_finder()
+
+def _scan_violations(text: str, categories: Optional[Iterable[str]]):
+    """
+    Yield (_COMPILED_VIOLATIONS index, match) for every violation in text
+    
+    Matches come out pattern by pattern in PHYSICS_VIOLATIONS order.
+    """
+    if categories is not None:
+        categories = list(dict.fromkeys(categories))
+        unknown = [category for category in categories if category not in PHYSICS_VIOLATIONS]
+        if unknown:
+            raise ValueError(f"Unknown physics categories: {', '.join(unknown)}")
+    
+    # Every scan runs on one lowercased copy; its spans index text as well
+    folded = _fold(text)
+    
+    # One pass for anchor words; a pattern whose anchors are all absent cannot match
+    candidates = _find_candidates(folded)
+    if categories is not None:
+        candidates &= {i for category in categories for i in _CATEGORY_INDICES[category]}
+        # Only gate on categories that still have a candidate pattern
+        categories = [category for category in categories
+                      if not candidates.isdisjoint(_CATEGORY_INDICES[category])]
+    if not candidates:
+        return
+    
+    # Nothing matches anywhere if the fused pattern finds nothing; otherwise no pattern
+    # can match before its first hit, so the per-pattern scans start there
+    start = _first_match_start(folded, categories)
+    if start is None:
+        return
+    
+    # Per-pattern scans keep overlapping violations from different patterns
+    for i, (_, compiled, _, exceptions) in enumerate(_COMPILED_VIOLATIONS):
+        if i in candidates:
+            for match in _iter_matches(compiled, exceptions, folded, start):
+                yield i, match
+
+def analyze_physics_violations(text: str, categories: Optional[Iterable[str]] = None) -> Dict:
     """
     Analyze text for physics violations
     
     Args:
         text: Story text to analyze
+        categories: PHYSICS_VIOLATIONS keys to check (e.g. ("gravity", "biology")),
+            or None for all of them
     
     Returns:
         Dict with violation categories and detected violations
     """
-    text_lower = text.lower()
-    
     results = {
         "has_violations": False,
         "total_violations": 0,
@@ -165,33 +645,61 @@ def analyze_physics_violations(text: str) -> Dict:
         "all_violations": []
     }
     
-    for category_id, category_info in PHYSICS_VIOLATIONS.items():
-        category_violations = []
-        
-        for pattern, description in category_info["patterns"]:
-            matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-            for match in matches:
-                violation = {
-                    "category": category_info["name"],
-                    "description": description,
-                    "matched_text": match.group(0),
-                    "position": match.span(),
-                    "context": get_context(text, match.span(), 50)
-                }
-                category_violations.append(violation)
-                results["all_violations"].append(violation)
-        
-        if category_violations:
-            results["violations_by_category"][category_info["name"]] = category_violations
-            results["has_violations"] = True
+    by_category = defaultdict(list)
+    for i, match in _scan_violations(text, categories):
+        category_name, _, description, _ = _COMPILED_VIOLATIONS[i]
+        match_start, match_end = match.span()
+        violation = {
+            "category": category_name,
+            "description": description,
+            "matched_text": text[match_start:match_end],
+            "position": (match_start, match_end),
+            "context": get_context(text, match_start, match_end, 50)
+        }
+        by_category[category_name].append(violation)
     
+    # Patterns ran in category order, so flattening the groups keeps match order
+    results["violations_by_category"] = dict(by_category)
+    results["all_violations"] = [v for category_violations in by_category.values() for v in category_violations]
+    results["has_violations"] = bool(results["all_violations"])
     results["total_violations"] = len(results["all_violations"])
     
     return results
 
-def get_context(text: str, span: Tuple[int, int], context_chars: int = 50) -> str:
-    """Extract context around a match"""
-    start, end = span
+# (category name, description) of each _COMPILED_VIOLATIONS entry, shared by every span
+_SPAN_LABELS = [(category_name, description) for category_name, _, description, _ in _COMPILED_VIOLATIONS]
+
+def find_violation_spans(text: str, categories: Optional[Iterable[str]] = None):
+    """
+    Violation offsets only, without building a dict per violation (e.g. for highlighting)
+    
+    Args:
+        text: Story text to analyze
+        categories: PHYSICS_VIOLATIONS keys to check, or None for all of them
+    
+    Returns:
+        (spans, labels) - spans is an (N, 2) int32 array of [start, end) offsets (a list
+        of (start, end) tuples without numpy) and labels[k] is the shared
+        (category name, description) tuple of span k, in analyze_physics_violations order
+    """
+    starts = []
+    ends = []
+    labels = []
+    for i, match in _scan_violations(text, categories):
+        starts.append(match.start())
+        ends.append(match.end())
+        labels.append(_SPAN_LABELS[i])
+    
+    if np is None:
+        return list(zip(starts, ends)), labels
+    
+    spans = np.empty((len(starts), 2), dtype=np.int32)
+    spans[:, 0] = starts
+    spans[:, 1] = ends
+    return spans, labels
+
+def get_context(text: str, start: int, end: int, context_chars: int = 50) -> str:
+    """Extract context around the match at text[start:end]"""
     context_start = max(0, start - context_chars)
     context_end = min(len(text), end + context_chars)
     
@@ -205,6 +713,12 @@ def get_context(text: str, span: Tuple[int, int], context_chars: int = 50) -> st
     
     return context
 
+# LRU cache of check_story_physics results: digest of (categories, story) -> (is_valid, report_html)
+# Request threads share it, so every access holds _PHYSICS_CACHE_LOCK (the analysis runs outside it)
+_PHYSICS_CACHE = OrderedDict()
+_PHYSICS_CACHE_MAX = 256
+_PHYSICS_CACHE_LOCK = threading.Lock()
+
 def generate_violation_report(violations: Dict) -> str:
     """
     Generate human-readable HTML report of violations
@@ -218,39 +732,85 @@ def generate_violation_report(violations: Dict) -> str:
     if not violations["has_violations"]:
         return "<p style='color: #2ecc71;'>✅ <strong>No physics violations detected!</strong> Story follows known physical laws.</p>"
     
-    report = [
-        f"<h3 style='color: #e74c3c;'>⚠️ Physics Violations Detected: {violations['total_violations']}</h3>",
-        "<p>The following violations of fundamental physics laws were found:</p>"
-    ]
+    report = io.StringIO()
+    write = report.write
+    write(f"<h3 style='color: #e74c3c;'>⚠️ Physics Violations Detected: {violations['total_violations']}</h3>\n")
+    write("<p>The following violations of fundamental physics laws were found:</p>")
     
     for category_name, category_violations in violations["violations_by_category"].items():
-        report.append(f"<h4 style='color: #e67e22;'>{category_name} ({len(category_violations)} violation{'s' if len(category_violations) > 1 else ''})</h4>")
-        report.append("<ul>")
+        write(f"\n<h4 style='color: #e67e22;'>{category_name} ({len(category_violations)} violation{'s' if len(category_violations) > 1 else ''})</h4>")
+        write("\n<ul>")
         
         for v in category_violations:
-            report.append(f"<li>")
-            report.append(f"<strong>{v['description']}</strong><br/>")
-            report.append(f"<em>Matched text:</em> \"{v['matched_text']}\"<br/>")
-            report.append(f"<em>Context:</em> <span style='background: #fff3cd; padding: 2px 4px;'>{v['context']}</span>")
-            report.append(f"</li>")
+            # Matched text and context are story text - escape before embedding in HTML
+            write("\n<li>")
+            write(f"\n<strong>{v['description']}</strong><br/>")
+            write(f"\n<em>Matched text:</em> \"{html.escape(v['matched_text'])}\"<br/>")
+            write(f"\n<em>Context:</em> <span style='background: #fff3cd; padding: 2px 4px;'>{html.escape(v['context'])}</span>")
+            write("\n</li>")
         
-        report.append("</ul>")
+        write("\n</ul>")
     
-    return "\n".join(report)
+    return report.getvalue()
 
-def check_story_physics(story_text: str) -> Tuple[bool, str]:
+def check_story_physics(story_text: str, categories: Optional[Iterable[str]] = None) -> Tuple[bool, str]:
     """
     Main entry point - check if story violates physics
     
     Args:
         story_text: Story to check
+        categories: PHYSICS_VIOLATIONS keys to check, or None for all of them
     
     Returns:
         (is_valid, report_html) - True if no violations, False otherwise
     """
-    violations = analyze_physics_violations(story_text)
-    report = generate_violation_report(violations)
+    if categories is not None:
+        categories = tuple(categories)
+    
+    # Repeat checks of the same story (retries, re-renders) are served from the cache
+    key = "\0".join((",".join(sorted(set(categories))) if categories is not None else "*", story_text))
+    key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    with _PHYSICS_CACHE_LOCK:
+        cached = _PHYSICS_CACHE.get(key)
+        if cached is not None:
+            _PHYSICS_CACHE.move_to_end(key)
+            return cached
+    
+    violations = analyze_physics_violations(story_text, categories)
+    result = (not violations["has_violations"], generate_violation_report(violations))
+    
+    with _PHYSICS_CACHE_LOCK:
+        _PHYSICS_CACHE[key] = result
+        if len(_PHYSICS_CACHE) > _PHYSICS_CACHE_MAX:
+            _PHYSICS_CACHE.popitem(last=False)
     
-    is_valid = not violations["has_violations"]
+    return result
+
+# Anchor words in RE2 syntax for pyarrow. Its \\b only knows ASCII word characters, so
+# a non-ASCII letter next to an anchor counts as a boundary - an extra candidate at worst.
+_ANCHOR_REGEX = r'\b(?:' + '|'.join(word + (r'\b' if whole else '') for word, whole in _ANCHORS) + ')'
+
+def check_stories_physics(story_texts: List[str], categories: Optional[Iterable[str]] = None) -> List[Tuple[bool, str]]:
+    """
+    Check a batch of stories
+    
+    With pyarrow installed, one vectorized regex scan over the whole (folded) batch finds
+    the stories containing an anchor word; the others cannot match any pattern and are
+    reported clean without running a pattern.
+    
+    Args:
+        story_texts: Stories to check
+        categories: PHYSICS_VIOLATIONS keys to check, or None for all of them
+    
+    Returns:
+        List of (is_valid, report_html) in story order, as from check_story_physics
+    """
+    if pa is None or _UNANCHORED:
+        return [check_story_physics(text, categories) for text in story_texts]
     
-    return is_valid, report
\ No newline at end of file
+    anchored = pc.match_substring_regex(
+        pa.array([_fold(text) for text in story_texts], type=pa.string()), _ANCHOR_REGEX
+    ).to_pylist()
+    clean = (True, generate_violation_report({"has_violations": False}))
+    return [check_story_physics(text, categories) if hit else clean
+            for text, hit in zip(story_texts, anchored)]
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""
+Prompt Cache Module
+Pre-tokenized static segments of the creative retelling prompt
+"""
+import torch
+
+import llm_reasoner
+from llm_reasoner import USER_TAG
+from context_builder import STYLE_WORDS, build_creative_segments
+
+# Token ids of the static text around the story: {style: (head_ids, tail_ids)}
+STYLE_SEGMENT_IDS = {}
+
+def encode_continuation(text):
+    """
+    Token ids for text as it tokenizes after a newline
+    
+    SentencePiece adds a dummy-prefix space to the start of every string it encodes.
+    Encoding behind a newline anchor and dropping the anchor ids keeps segments that
+    are concatenated later identical to tokenizing the joined prompt in one go.
+    """
+    tokenizer = llm_reasoner.tokenizer
+    n_anchor = len(tokenizer("\n", add_special_tokens=False).input_ids)
+    ids = tokenizer("\n" + text, return_tensors="pt", add_special_tokens=False).input_ids
+    return ids[:, n_anchor:]
+
+def get_style_segment_ids(style):
+    """Return (head_ids, tail_ids) for a style, tokenizing them on first use"""
+    if style not in STYLE_SEGMENT_IDS:
+        tokenizer = llm_reasoner.tokenizer
+        head, tail = build_creative_segments(style)
+        # Same chat-template wrapping as llm_reasoner.format_user_segment
+        head_ids = tokenizer(f"{USER_TAG}\n{head}", return_tensors="pt", add_special_tokens=False).input_ids
+        tail_ids = encode_continuation(f"{tail}</s>\n<|assistant|>\n")
+        STYLE_SEGMENT_IDS[style] = (head_ids, tail_ids)
+    return STYLE_SEGMENT_IDS[style]
+
+def warm_style_segments():
+    """Tokenize the static segments of every style (called at startup)"""
+    if llm_reasoner.backend != "transformers":
+        return
+    for style in tuple(word.capitalize() for word in STYLE_WORDS) + ("unknown",):
+        get_style_segment_ids(style)
+    print(f"✓ Pre-tokenized {len(STYLE_SEGMENT_IDS)} creative prompt styles")
+
+def get_creative_input_ids(style, story):
+    """
+    Token ids of the creative user segment, tokenizing only the story
+    
+    Args:
+        style: Style as returned by context_builder.detect_style
+        story: Original story text
+    
+    Returns:
+        Tensor of user-segment ids for generate_answer(user_ids=...), or None when
+        the transformers tokenizer is not loaded (e.g. on the llama.cpp backend)
+    """
+    if llm_reasoner.backend != "transformers" or llm_reasoner.tokenizer is None:
+        return None
+    
+    head_ids, tail_ids = get_style_segment_ids(style)
+    story_ids = encode_continuation(story)
+    return torch.cat([head_ids, story_ids, tail_ids], dim=1)
@@ -1,18 +1,69 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
 import json
 import os
 import time
 from datetime import datetime
 import re
+import atexit
+import sqlite3
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from collections import Counter
+from collections import Counter, OrderedDict
 import hashlib
+import heapq
+import itertools
+from operator import itemgetter
+
+# orjson is optional - faster JSON for session storage, the ConceptNet cache and responses
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# aiohttp is optional - with it the ConceptNet lookups for a story share one event loop
+# and keep-alive connection pool instead of a thread pool of blocking requests
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# pyahocorasick is optional - without it each hallucination keyword list is one compiled regex
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# waitress is optional - a production WSGI server; one process with a thread pool keeps
+# the model, sessions and caches shared between requests
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+# flask-compress is optional - zstd/brotli/gzip Content-Encoding for the JSON bodies,
+# whose graphs repeat the same keys on every node and edge
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# uringcore is optional - io_uring-based event loop for those lookups on Linux
+if aiohttp is not None:
+    try:
+        import uringcore
+        asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+    except ImportError:
+        pass
 
 # Import existing modules
-from llm_reasoner import generate_answer, initialize_model
-from context_builder import build_context_prompt
+from llm_reasoner import generate_answer, generate_answer_stream, initialize_model
+from context_builder import build_context_prompt, build_system_prompt, detect_style, ANALYSIS_SYSTEM_PROMPT
+from prompt_cache import get_creative_input_ids, warm_style_segments
 from graph_queries import (
     find_concept_relationships, 
     find_path_between_concepts,
@@ -26,15 +77,85 @@ from physics_validator import check_story_physics, analyze_physics_violations
 app = Flask(__name__)
 CORS(app)
 
+if orjson is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """jsonify through orjson, keeping Flask's key sorting and default() hook"""
+        def dumps(self, obj, **kwargs):
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+    
+    app.json = OrjsonProvider(app)
+
+if Compress is not None:
+    app.config['COMPRESS_ALGORITHM'] = ['zstd', 'br', 'gzip']
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_STREAMS'] = False  # SSE answers must reach the client token by token
+    Compress(app)
+
 # In-memory storage
 sessions = {}
-conceptnet_cache = {}
-question_cache = {}
+session_id_lock = threading.Lock()
+last_session_stamp = 0
+question_cache = OrderedDict()  # Cache for repeated questions, keyed by (session_id, question)
+question_cache_lock = threading.Lock()  # request threads share the LRU caches; each has its own lock
+QUESTION_CACHE_MAX = 1024
 STORAGE_FILE = 'stories.json'
-CACHE_FILE = 'conceptnet_cache.json'
+
+# Mutations mark sessions dirty; a background thread appends the dirty sessions to
+# JOURNAL_FILE (one JSON event per line) and folds the journal into STORAGE_FILE once
+# it outgrows COMPACT_JOURNAL_BYTES
+JOURNAL_FILE = 'stories.log'
+COMPACT_JOURNAL_BYTES = 1 << 20
+SAVE_DEBOUNCE_SECONDS = 0.25
+sessions_dirty = threading.Event()
+dirty_session_ids = set()
+dirty_sessions_lock = threading.Lock()
+session_write_lock = threading.Lock()  # one writer for the snapshot and the journal
+session_flusher = None
+session_flusher_lock = threading.Lock()
+
+# Encoded GET bodies, reused until mark_sessions_dirty bumps the version they were built at:
+# {(session_id, variant): (version, body)}, with session_id None for the session list
+session_json_cache = {}
+session_versions = {}
+session_version_counter = itertools.count(1)
+
+# ConceptNet edges persist in SQLite (one row per concept, so a miss writes one row);
+# conceptnet_cache is an in-process LRU of the rows this process has read or fetched
+CACHE_DB = 'conceptnet_cache.db'
+LEGACY_CACHE_FILE = 'conceptnet_cache.json'
+conceptnet_db = None
+conceptnet_db_lock = threading.Lock()
+conceptnet_cache = OrderedDict()
+conceptnet_cache_lock = threading.Lock()
+CONCEPTNET_CACHE_MAX = 4096
+
+# ConceptNet has no multi-node query; blocking lookups share one keep-alive pool instead
+conceptnet_http = requests.Session()
+conceptnet_http.mount('http://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
+# Without aiohttp those lookups fan out over one shared pool (threads start lazily)
+conceptnet_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix='conceptnet')
+# Physics validation of a story overlaps its concept extraction and ConceptNet fetch.
+# physics_validator is safe to call from these threads: its result cache is locked and
+# Hyperscan scratch space is per thread.
+physics_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='physics')
+
+# With aiohttp, lookups run on one long-lived event loop thread so its ClientSession
+# (and the connections it keeps alive) is shared by every story
+conceptnet_loop = None
+conceptnet_loop_lock = threading.Lock()
+conceptnet_aio = None
+
+# extract_concepts results keyed by story digest, so re-submitted stories skip tokenizing
+concept_cache = OrderedDict()
+concept_cache_lock = threading.Lock()
+CONCEPT_CACHE_MAX = 256
 
 # Stopwords
-STOPWORDS = set(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+STOPWORDS = frozenset(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
                  'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'is',
                  'was', 'are', 'were', 'been', 'be', 'have', 'has', 'had', 'do', 'does',
                  'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'i',
@@ -60,124 +181,341 @@ CULTURAL_CONTEXTS = {
     'garden': 'Universal Nature'
 }
 
+# Patterns used on every request, compiled once
+WORD_RE = re.compile(r'\b[A-Za-z]{3,}\b')
+SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+# Devanagari, Arabic, Hiragana, Katakana and CJK ideographs - stripped in one pass
+NON_ENGLISH_SCRIPT_RE = re.compile(r'[\u0900-\u097F\u0600-\u06FF\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+')
+WHITESPACE_RE = re.compile(r'\s+')
+# Headings the LLM sometimes puts in front of a creative retelling
+BAD_PREFIX_RE = re.compile(r'(?:INDIAN STYLE|JAPANESE STYLE|AFRICAN STYLE|CHINESE STYLE|In the land of'
+                           r'|Original Story:|Concept Relationships:)')
+
+def dumps_json(obj, indent=False):
+    """UTF-8 JSON bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+def loads_json(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
 def load_sessions():
     global sessions
     if os.path.exists(STORAGE_FILE):
         try:
-            with open(STORAGE_FILE, 'r', encoding='utf-8') as f:
-                sessions = json.load(f)
+            with open(STORAGE_FILE, 'rb') as f:
+                sessions = loads_json(f.read())
             print(f"✓ Loaded {len(sessions)} sessions from disk")
         except Exception as e:
             print(f"✗ Error loading sessions: {e}")
             sessions = {}
+    
+    if os.path.exists(JOURNAL_FILE):
+        print(f"✓ Replayed {replay_journal()} session changes from {JOURNAL_FILE}")
+        compact_sessions()
+
+def replay_journal():
+    count = 0
+    with open(JOURNAL_FILE, 'rb') as f:
+        for line in f:
+            try:
+                event = loads_json(line)
+            except ValueError:
+                continue  # torn tail of an append cut short by a crash
+            if event['op'] == 'delete':
+                sessions.pop(event['sid'], None)
+            else:
+                sessions[event['sid']] = event['session']
+            count += 1
+    return count
 
 def save_sessions():
+    """Write sessions atomically (fsync'd temp file renamed over STORAGE_FILE)"""
+    tmp_file = STORAGE_FILE + '.tmp'
     try:
-        with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(sessions, f, indent=2)
+        data = dumps_json(sessions, indent=True)
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, STORAGE_FILE)
+        return True
     except Exception as e:
         print(f"✗ Error saving sessions: {e}")
+        return False
 
-def load_cache():
-    global conceptnet_cache
-    if os.path.exists(CACHE_FILE):
+def compact_sessions():
+    """Write the full snapshot, then drop the journal it supersedes"""
+    if not save_sessions():
+        return False
+    try:
+        os.remove(JOURNAL_FILE)
+    except FileNotFoundError:
+        pass
+    return True
+
+def append_journal(session_ids):
+    """Append the current state of each session (or its deletion); returns the journal size"""
+    lines = []
+    for session_id in session_ids:
+        session = sessions.get(session_id)
+        if session is None:
+            event = {'op': 'delete', 'sid': session_id}
+        else:
+            event = {'op': 'upsert', 'sid': session_id, 'session': session}
+        lines.append(dumps_json(event) + b'\n')
+    with open(JOURNAL_FILE, 'ab') as f:
+        f.write(b''.join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+def flush_sessions():
+    with session_write_lock:
+        with dirty_sessions_lock:
+            session_ids = list(dirty_session_ids)
+            dirty_session_ids.clear()
+        if not session_ids:
+            return True
         try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                conceptnet_cache = json.load(f)
-            print(f"✓ Loaded {len(conceptnet_cache)} cached concepts")
+            if append_journal(session_ids) <= COMPACT_JOURNAL_BYTES or compact_sessions():
+                return True
         except Exception as e:
-            print(f"✗ Error loading cache: {e}")
-            conceptnet_cache = {}
+            print(f"✗ Error journaling sessions: {e}")
+            # A failed append may leave a torn line; a snapshot covers it
+            if compact_sessions():
+                return True
+        # e.g. a request changed a session mid-encode - try again on the next round
+        with dirty_sessions_lock:
+            dirty_session_ids.update(session_ids)
+        return False
+
+def flush_sessions_forever():
+    while True:
+        sessions_dirty.wait()
+        # Let a burst of mutations land before writing once
+        time.sleep(SAVE_DEBOUNCE_SECONDS)
+        sessions_dirty.clear()
+        if not flush_sessions():
+            sessions_dirty.set()
+
+def mark_sessions_dirty(session_id):
+    """Schedule a save of one session on the background flusher, starting it on first use"""
+    global session_flusher
+    if session_flusher is None:
+        with session_flusher_lock:
+            if session_flusher is None:
+                session_flusher = threading.Thread(target=flush_sessions_forever, name='session-flusher', daemon=True)
+                session_flusher.start()
+    with dirty_sessions_lock:
+        dirty_session_ids.add(session_id)
+    sessions_dirty.set()
+    session_versions[session_id] = session_versions[None] = next(session_version_counter)
 
-def save_cache():
+def session_json_response(session_id, variant, build):
+    """jsonify(build()) for a session (or the list, for None), reusing the last encoded body"""
+    # Read the version before building, so a change that lands mid-encode is not cached
+    version = session_versions.get(session_id, 0)
+    key = (session_id, variant)
+    cached = session_json_cache.get(key)
+    if cached is None or cached[0] != version:
+        cached = session_json_cache[key] = (version, app.json.response(build()).get_data())
+    return app.response_class(cached[1], mimetype=app.json.mimetype)
+
+@atexit.register
+def flush_sessions_on_exit():
+    flush_sessions()
+
+def open_cache_db():
+    global conceptnet_db
+    conceptnet_db = sqlite3.connect(CACHE_DB, check_same_thread=False)
+    conceptnet_db.execute("PRAGMA journal_mode=WAL")
+    conceptnet_db.execute("PRAGMA synchronous=NORMAL")
+    conceptnet_db.execute("CREATE TABLE IF NOT EXISTS conceptnet (key TEXT PRIMARY KEY, edges TEXT NOT NULL)")
+    
+    # Seed a new database from the old whole-file JSON cache
+    count = conceptnet_db.execute("SELECT COUNT(*) FROM conceptnet").fetchone()[0]
+    if count == 0 and os.path.exists(LEGACY_CACHE_FILE):
+        try:
+            with open(LEGACY_CACHE_FILE, 'rb') as f:
+                legacy = loads_json(f.read())
+            with conceptnet_db_lock, conceptnet_db:
+                conceptnet_db.executemany("INSERT OR IGNORE INTO conceptnet VALUES (?, ?)",
+                                          [(key, dumps_json(edges)) for key, edges in legacy.items()])
+            count = len(legacy)
+        except Exception as e:
+            print(f"✗ Error importing {LEGACY_CACHE_FILE}: {e}")
+    
+    print(f"✓ ConceptNet cache: {count} concepts in {CACHE_DB}")
+
+def remember_relations(cache_key, edges):
+    with conceptnet_cache_lock:
+        conceptnet_cache[cache_key] = edges
+        conceptnet_cache.move_to_end(cache_key)
+        if len(conceptnet_cache) > CONCEPTNET_CACHE_MAX:
+            conceptnet_cache.popitem(last=False)
+
+def get_cached_relations(cache_key):
+    """Cached edges for a key, or None if the concept was never fetched"""
+    with conceptnet_cache_lock:
+        edges = conceptnet_cache.get(cache_key)
+        if edges is not None:
+            conceptnet_cache.move_to_end(cache_key)
+            return edges
+    with conceptnet_db_lock:
+        row = conceptnet_db.execute("SELECT edges FROM conceptnet WHERE key = ?", (cache_key,)).fetchone()
+    if row is None:
+        return None
+    edges = loads_json(row[0])
+    remember_relations(cache_key, edges)
+    return edges
+
+def store_relations(fetched):
+    """Cache {cache_key: edges} for everything one story fetched, in one transaction"""
+    for cache_key, edges in fetched.items():
+        remember_relations(cache_key, edges)
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(conceptnet_cache, f, indent=2)
+        with conceptnet_db_lock, conceptnet_db:
+            conceptnet_db.executemany("INSERT OR REPLACE INTO conceptnet VALUES (?, ?)",
+                                      [(cache_key, dumps_json(edges)) for cache_key, edges in fetched.items()])
     except Exception as e:
         print(f"✗ Error saving cache: {e}")
 
 def extract_concepts(text, limit=7):
-    words = re.findall(r'\b[A-Za-z]{3,}\b', text)
-    word_freq = Counter()
-    for word in words:
-        wl = word.lower()
-        if wl not in STOPWORDS:
-            word_freq[wl] += 1
-
-    sentences = re.split(r'[.!?]+', text)
-    proper_nouns = set()
-    for sentence in sentences:
-        sentence_words = sentence.strip().split()
-        for i, word in enumerate(sentence_words):
-            if i > 0 and word and word[0].isupper() and len(word) > 2:
-                proper_nouns.add(word.lower())
-
-    scored = []
-    for w, f in word_freq.items():
-        score = f
-        if w in proper_nouns:
-            score += 3
-        if len(w) > 6:
-            score += 1
-        scored.append((w, score))
-    scored.sort(key=lambda x: x[1], reverse=True)
-    concepts = [w for w, s in scored[:limit]]
+    key = (hashlib.blake2b(text.encode(), digest_size=16).digest(), limit)
+    with concept_cache_lock:
+        cached = concept_cache.get(key)
+        if cached is not None:
+            concept_cache.move_to_end(key)
+    if cached is not None:
+        concepts, proper_nouns = cached
+        return list(concepts), proper_nouns
+    
+    # Counter and map count in C; dropping stopwords afterwards keeps first-seen order
+    word_freq = Counter(map(str.lower, WORD_RE.findall(text)))
+    for stopword in STOPWORDS & word_freq.keys():
+        del word_freq[stopword]
+
+    # Capitalized words that don't start a sentence
+    proper_nouns = {word.lower()
+                    for sentence in SENTENCE_SPLIT_RE.split(text)
+                    for word in sentence.split()[1:]
+                    if word[0].isupper() and len(word) > 2}
+
+    # Frequency, +3 for proper nouns, +1 for long words
+    scored = ((w, f + (3 if w in proper_nouns else 0) + (len(w) > 6))
+              for w, f in word_freq.items())
+    # Same order as a stable sort by score, without sorting the whole list
+    top = heapq.nlargest(limit, scored, key=itemgetter(1))
+    concepts = [w for w, s in top]
+    proper_nouns = frozenset(proper_nouns)
+    
+    with concept_cache_lock:
+        concept_cache[key] = (tuple(concepts), proper_nouns)
+        if len(concept_cache) > CONCEPT_CACHE_MAX:
+            concept_cache.popitem(last=False)
     return concepts, proper_nouns
 
+def conceptnet_url(concept, limit):
+    return f"http://api.conceptnet.io/query?node=/c/en/{concept}&limit={limit}"
+
+def parse_conceptnet_edges(data, limit):
+    edges = []
+    for edge in data.get('edges', [])[:limit]:
+        start = edge.get('start', {}).get('label', '')
+        end = edge.get('end', {}).get('label', '')
+        rel = edge.get('rel', {}).get('label', 'related')
+        weight = edge.get('weight', 1.0)
+        edges.append({'start': start, 'end': end, 'relation': rel, 'weight': weight})
+    return edges
+
 def fetch_conceptnet_relations(concept, limit=5):
-    cache_key = f"{concept}_{limit}"
-    if cache_key in conceptnet_cache:
-        return conceptnet_cache[cache_key]
-    url = f"http://api.conceptnet.io/query?node=/c/en/{concept}&limit={limit}"
+    """Edges for one concept, or None when the lookup failed (failures are not cached)"""
     try:
-        response = requests.get(url, timeout=4)
-        if response.status_code == 200:
-            data = response.json()
-            edges = []
-            for edge in data.get('edges', [])[:limit]:
-                start = edge.get('start', {}).get('label', '')
-                end = edge.get('end', {}).get('label', '')
-                rel = edge.get('rel', {}).get('label', 'related')
-                weight = edge.get('weight', 1.0)
-                edges.append({'start': start, 'end': end, 'relation': rel, 'weight': weight})
-            conceptnet_cache[cache_key] = edges
-            save_cache()
-            return edges
-        else:
-            return []
+        response = conceptnet_http.get(conceptnet_url(concept, limit), timeout=4)
+        if response.status_code != 200:
+            return None
+        return parse_conceptnet_edges(loads_json(response.content), limit)
+    except Exception as e:
+        print(f"✗ Error fetching ConceptNet for '{concept}': {e}")
+        return None
+
+async def fetch_conceptnet_relations_async(session, concept, limit):
+    """Edges for one concept, or None when the lookup failed (failures are not cached)"""
+    try:
+        async with session.get(conceptnet_url(concept, limit)) as response:
+            if response.status != 200:
+                return None
+            data = loads_json(await response.read())
+        return parse_conceptnet_edges(data, limit)
     except Exception as e:
         print(f"✗ Error fetching ConceptNet for '{concept}': {e}")
-        return []
+        return None
+
+async def fetch_uncached_relations(concepts, limit):
+    global conceptnet_aio
+    if conceptnet_aio is None:
+        conceptnet_aio = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+                                               timeout=aiohttp.ClientTimeout(total=4))
+    fetched = await asyncio.gather(*(fetch_conceptnet_relations_async(conceptnet_aio, c, limit)
+                                     for c in concepts))
+    return dict(zip(concepts, fetched))
+
+def run_on_conceptnet_loop(coro):
+    """Run a coroutine on the lookup loop from a request thread, starting the loop on first use"""
+    global conceptnet_loop
+    if conceptnet_loop is None:
+        with conceptnet_loop_lock:
+            if conceptnet_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='conceptnet-loop', daemon=True).start()
+                conceptnet_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, conceptnet_loop).result()
+
+@atexit.register
+def close_conceptnet_session():
+    if conceptnet_aio is not None:
+        asyncio.run_coroutine_threadsafe(conceptnet_aio.close(), conceptnet_loop).result(timeout=2)
 
 def fetch_all_relations_parallel(concepts, limit=5):
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(fetch_conceptnet_relations, c, limit): c for c in concepts}
-        results = {}
-        for fut in futures:
-            c = futures[fut]
-            try:
-                results[c] = fut.result()
-            except Exception as e:
-                print(f"✗ Error in parallel fetch for '{c}': {e}")
-                results[c] = []
+    results = {c: get_cached_relations(f"{c}_{limit}") for c in concepts}
+    missing = [c for c, edges in results.items() if edges is None]
+    if not missing:
         return results
+    
+    if aiohttp is not None:
+        fetched = run_on_conceptnet_loop(fetch_uncached_relations(missing, limit))
+    else:
+        fetched = dict(zip(missing, conceptnet_pool.map(fetch_conceptnet_relations, missing, [limit] * len(missing))))
+    
+    found = {f"{c}_{limit}": edges for c, edges in fetched.items() if edges is not None}
+    if found:
+        store_relations(found)
+    for c, edges in fetched.items():
+        results[c] = edges or []
+    return results
 
 def detect_cultural_context(concepts):
-    markers = []
-    for c in concepts:
-        if c in CULTURAL_CONTEXTS:
-            markers.append({'concept': c, 'culture': CULTURAL_CONTEXTS[c]})
-    if markers:
-        cultures = [m['culture'] for m in markers]
-        from collections import Counter
-        dom = Counter(cultures).most_common(1)[0][0]
-    else:
-        dom = "Universal"
+    markers = [{'concept': c, 'culture': CULTURAL_CONTEXTS[c]} for c in concepts if c in CULTURAL_CONTEXTS]
+    cultures = Counter(m['culture'] for m in markers)
+    dom = cultures.most_common(1)[0][0] if cultures else "Universal"
     return {'dominant_culture': dom, 'markers': markers}
 
+def related_node(node_id, label):
+    return {
+        'id': node_id,
+        'label': label,
+        'type': 'related',
+        'from_story': False,
+        'size': 50,
+        'cultural_context': 'Universal'
+    }
+
 def build_enhanced_graph(concepts, all_relations, proper_nouns):
     all_nodes = {}
     all_edges = []
+    seen_edges = set()  # ConceptNet returns the same edge for both of its endpoints
     for concept in concepts:
         node_id = concept.lower().replace(' ', '_')
         all_nodes[node_id] = {
@@ -188,34 +526,48 @@ def build_enhanced_graph(concepts, all_relations, proper_nouns):
             'size': 70,
             'cultural_context': CULTURAL_CONTEXTS.get(concept, 'Universal')
         }
-    for concept, edges in all_relations.items():
+    n_main = len(all_nodes)
+    
+    # The same labels recur across concepts; normalize each distinct label once.
+    # Empty labels have no node.
+    label_ids = {'': None, None: None}
+    stopwords = STOPWORDS
+    add_edge = all_edges.append
+    
+    for edges in all_relations.values():
         for edge in edges:
-            for node_label in [edge['start'], edge['end']]:
-                if not node_label:
-                    continue
-                node_id = node_label.lower().replace(' ', '_')
-                if node_id not in all_nodes and node_label.lower() not in STOPWORDS:
-                    all_nodes[node_id] = {
-                        'id': node_id,
-                        'label': node_label,
-                        'type': 'related',
-                        'from_story': False,
-                        'size': 50,
-                        'cultural_context': 'Universal'
-                    }
-            start_id = edge['start'].lower().replace(' ', '_') if edge['start'] else None
-            end_id = edge['end'].lower().replace(' ', '_') if edge['end'] else None
-            if start_id and end_id and start_id in all_nodes and end_id in all_nodes:
-                all_edges.append({
-                    'source': start_id,
-                    'target': end_id,
-                    'label': edge['relation'],
-                    'weight': edge.get('weight', 1.0)
-                })
+            start = edge['start']
+            end = edge['end']
+            relation = edge['relation']
+            try:
+                start_id = label_ids[start]
+            except KeyError:
+                start_id = label_ids[start] = start.lower().replace(' ', '_')
+            try:
+                end_id = label_ids[end]
+            except KeyError:
+                end_id = label_ids[end] = end.lower().replace(' ', '_')
+            
+            # Stopwords have no spaces, so the id equals the lowercased label for them
+            if start_id and start_id not in all_nodes and start_id not in stopwords:
+                all_nodes[start_id] = related_node(start_id, start)
+            if end_id and end_id not in all_nodes and end_id not in stopwords:
+                all_nodes[end_id] = related_node(end_id, end)
+            
+            if start_id in all_nodes and end_id in all_nodes:
+                edge_key = (start_id, end_id, relation)
+                if edge_key not in seen_edges:
+                    seen_edges.add(edge_key)
+                    add_edge({
+                        'source': start_id,
+                        'target': end_id,
+                        'label': relation,
+                        'weight': edge.get('weight', 1.0)
+                    })
     stats = {
         'total_nodes': len(all_nodes),
-        'main_concepts': len([n for n in all_nodes.values() if n['from_story']]),
-        'related_concepts': len([n for n in all_nodes.values() if not n['from_story']]),
+        'main_concepts': n_main,
+        'related_concepts': len(all_nodes) - n_main,
         'total_edges': len(all_edges),
         'depth': 2 if len(all_edges) > 0 else 1
     }
@@ -253,10 +605,17 @@ def generate_enhanced_response(concepts, categorized, cultural_info, graph_stats
 def index():
     return send_from_directory('.', 'index.html')
 
+def new_session_id():
+    """session_<ms>, moved past the previous id when concurrent requests share a millisecond"""
+    global last_session_stamp
+    with session_id_lock:
+        last_session_stamp = max(int(time.time() * 1000), last_session_stamp + 1)
+        return f"session_{last_session_stamp}"
+
 @app.route('/sessions', methods=['GET', 'POST'])
 def handle_sessions():
     if request.method == 'POST':
-        session_id = f"session_{int(time.time() * 1000)}"
+        session_id = new_session_id()
         sessions[session_id] = {
             'id': session_id,
             'name': f"Story {len(sessions) + 1}",
@@ -273,22 +632,43 @@ def handle_sessions():
                 'analyzed': False
             }
         }
-        save_sessions()
+        mark_sessions_dirty(session_id)
         return jsonify(sessions[session_id])
     else:
-        return jsonify(list(sessions.values()))
+        return session_json_response(None, None, lambda: list(sessions.values()))
+
+# Column order of node and edge rows in a columnar graph_data
+GRAPH_NODE_COLS = ('id', 'label', 'type', 'from_story', 'size', 'cultural_context')
+GRAPH_EDGE_COLS = ('source', 'target', 'label', 'weight')
+
+def columnar_graph(graph_data):
+    """graph_data with nodes and edges as rows under one column list, instead of keyed dicts"""
+    return {
+        **graph_data,
+        'node_cols': GRAPH_NODE_COLS,
+        'nodes': [[node.get(col) for col in GRAPH_NODE_COLS] for node in graph_data.get('nodes', [])],
+        'edge_cols': GRAPH_EDGE_COLS,
+        'edges': [[edge.get(col) for col in GRAPH_EDGE_COLS] for edge in graph_data.get('edges', [])]
+    }
 
 @app.route('/sessions/<session_id>', methods=['GET', 'DELETE', 'POST'])
 def session_item(session_id):
     if request.method == 'GET':
         if session_id in sessions:
-            return jsonify(sessions[session_id])
+            session = sessions[session_id]
+            # ?graph=columns drops the per-node and per-edge key repetition from the response
+            if request.args.get('graph') == 'columns':
+                return session_json_response(session_id, 'columns', lambda: {
+                    **session, 'graph_data': columnar_graph(session.get('graph_data', {}))})
+            return session_json_response(session_id, None, lambda: session)
         else:
             return jsonify({'error': 'Session not found'}), 404
     elif request.method == 'DELETE':
         if session_id in sessions:
             del sessions[session_id]
-            save_sessions()
+            mark_sessions_dirty(session_id)
+            for variant in (None, 'columns'):
+                session_json_cache.pop((session_id, variant), None)
             return jsonify({'message': f'Session {session_id} deleted'})
         else:
             return jsonify({'error': 'Session not found'}), 404
@@ -299,11 +679,15 @@ def session_item(session_id):
             return jsonify({'error': 'No name provided'}), 400
         if session_id in sessions:
             sessions[session_id]['name'] = new_name
-            save_sessions()
+            mark_sessions_dirty(session_id)
             return jsonify({'message': f"Session renamed to '{new_name}'", 'session': sessions[session_id]})
         else:
             return jsonify({'error': 'Session not found'}), 404
 
+def run_physics_checks(story):
+    physics_valid, physics_report = check_story_physics(story)
+    return physics_valid, physics_report, analyze_physics_violations(story)
+
 @app.route('/sessions/<session_id>/story', methods=['POST'])
 def analyze_story(session_id):
     if session_id not in sessions:
@@ -315,39 +699,37 @@ def analyze_story(session_id):
 
     print(f"\n{'='*40}\nAnalyzing story for {session_id}\n{'='*40}")
     
-    # NEW: Physics validation FIRST
+    # NEW: Physics validation runs alongside concept extraction and the ConceptNet fetch
     print("🔬 Running physics validation...")
-    physics_valid, physics_report = check_story_physics(story)
-    physics_violations = analyze_physics_violations(story)
+    physics_future = physics_pool.submit(run_physics_checks, story)
+    
+    # Store original story text
+    sessions[session_id]['story_text'] = story
+    sessions[session_id]['messages'].append({'role': 'user', 'content': story, 'timestamp': datetime.now().isoformat()})
+    
+    start_time = time.time()
+    concepts, proper_nouns = extract_concepts(story, limit=7)
+    # One pass; proper_nouns is a set
+    categorized = {'entities': [], 'themes': [], 'objects': []}
+    for c in concepts:
+        categorized['entities' if c in proper_nouns else 'objects'].append(c)
+
+    print(f"✓ Extracted concepts: {concepts}")
+    all_relations = fetch_all_relations_parallel(concepts, limit=5)
     
+    physics_valid, physics_report, physics_violations = physics_future.result()
     if physics_valid:
         print("✅ Physics validation PASSED - no violations detected")
     else:
         print(f"⚠️  Physics violations detected: {physics_violations['total_violations']} violations")
         for category, violations in physics_violations['violations_by_category'].items():
             print(f"   - {category}: {len(violations)} violation(s)")
-    
-    # Store original story text
-    sessions[session_id]['story_text'] = story
     sessions[session_id]['physics_validation'] = {
         'is_valid': physics_valid,
         'report_html': physics_report,
         'violations': physics_violations
     }
-    sessions[session_id]['messages'].append({'role': 'user', 'content': story, 'timestamp': datetime.now().isoformat()})
     
-    start_time = time.time()
-    concepts, proper_nouns = extract_concepts(story, limit=7)
-    categorized = {
-        'entities': [c for c in concepts if c in proper_nouns],
-        'themes': [], 'objects': []
-    }
-    for c in concepts:
-        if c not in categorized['entities']:
-            categorized['objects'].append(c)
-
-    print(f"✓ Extracted concepts: {concepts}")
-    all_relations = fetch_all_relations_parallel(concepts, limit=5)
     cultural_info = detect_cultural_context(concepts)
     graph_data = build_enhanced_graph(concepts, all_relations, proper_nouns)
     sessions[session_id]['graph_data'] = graph_data
@@ -369,7 +751,7 @@ def analyze_story(session_id):
         'timestamp': datetime.now().isoformat(),
         'concepts': concepts
     })
-    save_sessions()
+    mark_sessions_dirty(session_id)
     total_time = time.time() - start_time
     print(f"✓ Analysis finished in {total_time:.2f}s")
 
@@ -382,48 +764,48 @@ def analyze_story(session_id):
         'performance': {'total_time': f"{total_time:.2f}s"}
     })
 
-@app.route('/sessions/<session_id>/question', methods=['POST'])
-def answer_question(session_id):
-    """
-    LLM-powered question answering grounded in story + knowledge graph
-    """
+def read_question(session_id):
+    """Return (question, None) for a valid request, or (None, error response)"""
     if session_id not in sessions:
-        return jsonify({'error': 'Session not found'}), 404
+        return None, (jsonify({'error': 'Session not found'}), 404)
     
     data = request.json or {}
     question = data.get('question', '').strip()
     if not question:
-        return jsonify({'error': 'No question provided'}), 400
+        return None, (jsonify({'error': 'No question provided'}), 400)
     
-    session = sessions[session_id]
-    meta = session.get('metadata', {})
+    if not sessions[session_id].get('metadata', {}).get('analyzed'):
+        return None, (jsonify({'error': 'Story not analyzed yet. Send the story first via /story'}), 400)
     
-    if not meta.get('analyzed'):
-        return jsonify({'error': 'Story not analyzed yet. Send the story first via /story'}), 400
-
     print(f"\n{'='*40}\nAnswering question for {session_id}\n{'='*40}")
     print(f"Question: {question}")
-    
-    start_time = time.time()
-    
-    # Check cache for repeated questions
-    cache_key = hashlib.md5(f"{session_id}_{question}".encode()).hexdigest()
-    if cache_key in question_cache:
+    return question, None
+
+def record_exchange(session_id, question, answer, **extra):
+    """Append a question and its answer to the session history"""
+    # Both are recorded once the answer exists, so they share one stamp
+    timestamp = datetime.now().isoformat()
+    sessions[session_id]['messages'].extend((
+        {'role': 'user', 'content': question, 'timestamp': timestamp},
+        {'role': 'assistant', 'content': answer, 'timestamp': timestamp, **extra}
+    ))
+    mark_sessions_dirty(session_id)
+
+def get_cached_question(session_id, question):
+    """Answer a repeated question from question_cache, or return None"""
+    cache_key = (session_id, question)
+    with question_cache_lock:
+        cached_answer = question_cache.get(cache_key)
+        if cached_answer is not None:
+            question_cache.move_to_end(cache_key)
+    if cached_answer is not None:
         print("✓ Cache hit - returning cached answer")
-        cached_answer = question_cache[cache_key]
-        sessions[session_id]['messages'].append({
-            'role': 'user', 
-            'content': question, 
-            'timestamp': datetime.now().isoformat()
-        })
-        sessions[session_id]['messages'].append({
-            'role': 'assistant',
-            'content': cached_answer,
-            'timestamp': datetime.now().isoformat(),
-            'cached': True
-        })
-        save_sessions()
-        return jsonify({'message': cached_answer, 'cached': True})
+        record_exchange(session_id, question, cached_answer, cached=True)
+    return cached_answer
+
+def plan_answer(session, question):
+    """Graph context, prompt and generation settings for a question"""
+    meta = session.get('metadata', {})
     
     # Extract data from session
     story_text = session.get('story_text', '')
@@ -459,31 +841,51 @@ def answer_question(session_id):
     # Detect if creative request (needs more tokens)
     is_creative = any(word in question.lower() for word in ['style', 'retell', 'narrate', 'rewrite', 'tell the story'])
     max_tokens = 400 if is_creative else 300
+    # Retellings only need the story and one short example; cap the prompt instead of a full window
+    max_input_tokens = 1024 if is_creative else 2048
     
     print(f"🎨 Creative request detected: {is_creative}")
     
-    # Generate answer
-    try:
-        raw_answer = generate_answer(context_prompt, max_new_tokens=max_tokens, temperature=0.7)
-        
-        if not raw_answer or len(raw_answer) < 10:
-            print("⚠️  LLM response too short, trying again with fallback")
-            raw_answer = generate_fallback_answer(question, concepts, graph_data, cultural_info)
-    except Exception as e:
-        print(f"✗ Error generating answer: {e}")
-        import traceback
-        traceback.print_exc()
-        raw_answer = generate_fallback_answer(question, concepts, graph_data, cultural_info)
+    # Retellings reuse the pre-tokenized style segments and only tokenize the story
+    user_ids = get_creative_input_ids(detect_style(question), story_text) if is_creative else None
+    
+    return {
+        'story_text': story_text,
+        'graph_data': graph_data,
+        'concepts': concepts,
+        'cultural_info': cultural_info,
+        'mentioned_concepts': mentioned_concepts,
+        'specific_paths': specific_paths,
+        'is_creative': is_creative,
+        'prompt': context_prompt,
+        'generation': {
+            'max_new_tokens': max_tokens,
+            'temperature': 0.7,
+            'system_prompt': build_system_prompt(question),
+            'max_input_tokens': max_input_tokens,
+            'user_ids': user_ids,
+            'creative': is_creative
+        }
+    }
+
+def finish_answer(session_id, question, raw_answer, plan):
+    """Post-process a raw LLM answer into HTML, then cache and record it"""
+    concepts = plan['concepts']
+    mentioned_concepts = plan['mentioned_concepts']
+    
+    if not raw_answer or len(raw_answer) < 10:
+        print("⚠️  LLM response too short, trying again with fallback")
+        raw_answer = generate_fallback_answer(question, concepts, plan['graph_data'], plan['cultural_info'])
     
     print(f"📝 Raw answer length: {len(raw_answer)} characters")
     
     # Post-process answer to check for hallucination
-    processed_answer = post_process_answer(raw_answer, concepts, mentioned_concepts, story_text, question)
+    processed_answer = post_process_answer(raw_answer, concepts, mentioned_concepts, plan['story_text'], question)
     
     print(f"✅ Processed answer length: {len(processed_answer)} characters")
     
     # For creative requests, do additional formatting check
-    if is_creative:
+    if plan['is_creative']:
         processed_answer = clean_creative_answer(processed_answer)
     
     # Format as HTML
@@ -494,31 +896,91 @@ def answer_question(session_id):
         html_answer += "<p><small><em>Referenced concepts: " + ", ".join(c.capitalize() for c in mentioned_concepts) + "</em></small></p>"
     
     # Cache the answer
-    question_cache[cache_key] = html_answer
+    with question_cache_lock:
+        question_cache[(session_id, question)] = html_answer
+        if len(question_cache) > QUESTION_CACHE_MAX:
+            question_cache.popitem(last=False)
     
     # Save to session
-    sessions[session_id]['messages'].append({
-        'role': 'user',
-        'content': question,
-        'timestamp': datetime.now().isoformat()
-    })
-    sessions[session_id]['messages'].append({
-        'role': 'assistant',
-        'content': html_answer,
-        'timestamp': datetime.now().isoformat(),
-        'concepts_referenced': mentioned_concepts
-    })
-    save_sessions()
-    
+    record_exchange(session_id, question, html_answer, concepts_referenced=mentioned_concepts)
+    return html_answer
+
+def answer_payload(html_answer, plan, start_time):
     total_time = time.time() - start_time
     print(f"✓ Answer generated in {total_time:.2f}s")
-    
-    return jsonify({
+    return {
         'message': html_answer,
-        'concepts_referenced': mentioned_concepts,
-        'graph_paths_used': specific_paths,
+        'concepts_referenced': plan['mentioned_concepts'],
+        'graph_paths_used': plan['specific_paths'],
         'performance': {'total_time': f"{total_time:.2f}s"}
-    })
+    }
+
+def sse_event(payload):
+    return b"data: " + dumps_json(payload) + b"\n\n"
+
+@app.route('/sessions/<session_id>/question', methods=['POST'])
+def answer_question(session_id):
+    """
+    LLM-powered question answering grounded in story + knowledge graph
+    """
+    question, error = read_question(session_id)
+    if error:
+        return error
+    
+    start_time = time.time()
+    
+    # Check cache for repeated questions
+    cached_answer = get_cached_question(session_id, question)
+    if cached_answer is not None:
+        return jsonify({'message': cached_answer, 'cached': True})
+    
+    plan = plan_answer(sessions[session_id], question)
+    
+    # Generate answer
+    try:
+        raw_answer = generate_answer(plan['prompt'], **plan['generation'])
+    except Exception as e:
+        print(f"✗ Error generating answer: {e}")
+        import traceback
+        traceback.print_exc()
+        raw_answer = generate_fallback_answer(question, plan['concepts'], plan['graph_data'], plan['cultural_info'])
+    
+    html_answer = finish_answer(session_id, question, raw_answer, plan)
+    return jsonify(answer_payload(html_answer, plan, start_time))
+
+@app.route('/sessions/<session_id>/question/stream', methods=['POST'])
+def stream_answer_question(session_id):
+    """
+    answer_question as server-sent events
+    
+    Each generated chunk is sent as {'token': ...} while the LLM runs. The last event
+    is the post-processed answer_question payload with 'done': True; the client should
+    replace the streamed raw text with its HTML message.
+    """
+    question, error = read_question(session_id)
+    if error:
+        return error
+    
+    start_time = time.time()
+    
+    cached_answer = get_cached_question(session_id, question)
+    if cached_answer is not None:
+        return Response(sse_event({'message': cached_answer, 'cached': True, 'done': True}),
+                        mimetype='text/event-stream')
+    
+    plan = plan_answer(sessions[session_id], question)
+    
+    def events():
+        chunks = []
+        for text in generate_answer_stream(plan['prompt'], **plan['generation']):
+            chunks.append(text)
+            yield sse_event({'token': text})
+        
+        html_answer = finish_answer(session_id, question, "".join(chunks).strip(), plan)
+        yield sse_event({**answer_payload(html_answer, plan, start_time), 'done': True})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 def generate_fallback_answer(question, concepts, graph_data, cultural_info):
     """Generate graph-based answer when LLM unavailable or times out"""
@@ -542,10 +1004,9 @@ def clean_creative_answer(answer):
     """Clean up creative retelling answers"""
     # Remove non-English text
     original_length = len(answer)
-    answer = re.sub(r'[\u0900-\u097F]+', '', answer)  # Hindi
-    answer = re.sub(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+', '', answer)  # Japanese/Chinese
-    answer = re.sub(r'[\u0600-\u06FF]+', '', answer)  # Arabic
-    answer = re.sub(r'\s+', ' ', answer).strip()
+    if not answer.isascii():  # pure ASCII has no foreign script to remove
+        answer = NON_ENGLISH_SCRIPT_RE.sub('', answer)  # Hindi, Japanese/Chinese, Arabic
+    answer = WHITESPACE_RE.sub(' ', answer).strip()
     
     removed = original_length - len(answer)
     if removed > 100:
@@ -554,17 +1015,32 @@ def clean_creative_answer(answer):
     if len(answer) < 100:
         return "I apologize, but the response was generated in a non-English language. Please try asking the question again."
     
-    # Remove bad prefixes
-    bad_prefixes = ["INDIAN STYLE", "JAPANESE STYLE", "AFRICAN STYLE", "CHINESE STYLE", 
-                    "In the land of", "Original Story:", "Concept Relationships:"]
-    for prefix in bad_prefixes:
-        if answer.startswith(prefix):
-            parts = answer.split('.', 1)
-            if len(parts) > 1:
-                answer = parts[1].strip()
+    # Remove bad prefixes (one anchored match tests them all)
+    if BAD_PREFIX_RE.match(answer):
+        parts = answer.split('.', 1)
+        if len(parts) > 1:
+            answer = parts[1].strip()
     
     return answer
 
+def keyword_scanner(keywords):
+    """Return a function telling whether a lowercased text contains any of the keywords"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    
+    pattern = re.compile('|'.join(map(re.escape, keywords)))
+    return lambda text: pattern.search(text) is not None
+
+has_unrelated_term = keyword_scanner(['president', 'prime minister', 'politics', 'covid', 'pandemic',
+                                      'internet', 'google', 'facebook', 'iphone', 'bitcoin'])
+
+has_hallucination_phrase = keyword_scanner(['can be inferred', 'might be called', 'would be referred to',
+                                            'could be', 'might be', 'would be', 'may be'])
+
 def post_process_answer(answer, all_concepts, mentioned_concepts, story_text, question):
     """Clean and validate LLM answer - detect hallucinations"""
     answer = answer.strip()
@@ -575,19 +1051,12 @@ def post_process_answer(answer, all_concepts, mentioned_concepts, story_text, qu
     story_lower = story_text.lower()
     question_lower = question.lower()
     
-    unrelated_terms = ['president', 'prime minister', 'politics', 'covid', 'pandemic', 
-                       'internet', 'google', 'facebook', 'iphone', 'bitcoin']
-    
-    asking_unrelated = any(term in question_lower for term in unrelated_terms)
-    term_not_in_story = asking_unrelated and not any(term in story_lower for term in unrelated_terms)
+    term_not_in_story = has_unrelated_term(question_lower) and not has_unrelated_term(story_lower)
     
     if term_not_in_story:
         return "I don't have information about that in this story. I can only answer questions based on the story content."
     
-    hallucination_phrases = ['can be inferred', 'might be called', 'would be referred to',
-                            'could be', 'might be', 'would be', 'may be']
-    
-    if any(phrase in answer.lower() for phrase in hallucination_phrases):
+    if has_hallucination_phrase(answer.lower()):
         for word in question_lower.split():
             if len(word) > 3 and word not in ['what', 'who', 'where', 'when', 'tell']:
                 if word not in story_lower:
@@ -601,9 +1070,9 @@ def post_process_answer(answer, all_concepts, mentioned_concepts, story_text, qu
     
     return answer
 
-if __name__ == '__main__':
+def init_app():
     load_sessions()
-    load_cache()
+    open_cache_db()
     
     print("\n" + "="*60)
     print("🤖 ROBOT SELF-AWARENESS DEMO - PHYSICS VALIDATION ENABLED")
@@ -611,7 +1080,8 @@ if __name__ == '__main__':
     
     # Initialize LLM model at startup
     print("Initializing LLM...")
-    initialize_model()
+    initialize_model(system_prompts=[ANALYSIS_SYSTEM_PROMPT])
+    warm_style_segments()
     
     print("✓ ConceptNet caching enabled")
     print("✓ Parallel processing enabled")
@@ -619,6 +1089,14 @@ if __name__ == '__main__':
     print("✓ Question caching enabled")
     print("✓ Physics validation enabled 🔬")
     print("="*60 + "\n")
+
+
+if __name__ == '__main__':
+    init_app()
     
-    # Run dev server
-    app.run(debug=False, use_reloader=False, port=5000)
\ No newline at end of file
+    # Long generations only occupy their own thread (llm_reasoner serializes model use)
+    if waitress is not None:
+        waitress.serve(app, port=5000, threads=8, channel_timeout=600)
+    else:
+        # Run dev server
+        app.run(debug=False, use_reloader=False, port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""
+WSGI entry point for running under an external server, e.g.
+    waitress-serve --port=5000 --threads=8 --channel-timeout=600 wsgi:app
+
+Keep to a single process: sessions, caches and the model live in process memory.
+"""
+from server_with_physics import app, init_app
+
+init_app()